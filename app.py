@@ -1,19 +1,26 @@
+import contextlib
+import time
 import traceback
 import logging.config
 
 import pandas as pd
 from flask import Flask
-from flask import render_template, request
+from flask import g, jsonify, render_template, request
 
 from config.flaskconfig import SQLALCHEMY_DATABASE_URI
+from src.artifacts import read_frame
 from src.get_data import download_s3
 from src.create_db import Games, GameManager
+from src.name_index import GameNameIndex
+from src.neighbors import NeighborIndex
 
 # Initialize the Flask application
 app = Flask(__name__, template_folder="app/templates", static_folder="app/static")
 
 # Configure flask app from flask_config.py
 app.config.from_pyfile('config/flaskconfig.py')
+# Settings in the file named by the APP_SETTINGS environment variable override flaskconfig.py, e.g. for load tests
+app.config.from_envvar('APP_SETTINGS', silent=True)
 
 # Define LOGGING_CONFIG in flask_config.py - path to config file for setting
 # up the logger (e.g. config/logging/local.conf)
@@ -22,14 +29,45 @@ logger = logging.getLogger(app.config["APP_NAME"])
 logger.debug('Web app log')
 
 # Initialize the database session
-game_manager = GameManager(app, engine_string=SQLALCHEMY_DATABASE_URI)
-
-# Download necessary data from S3
-download_s3(app.config['LOCAL_SIMILARITY_PATH'], app.config['BUCKET_NAME'], app.config['BUCKET_SIMILARITY_PATH'])
+game_manager = GameManager(app, engine_string=SQLALCHEMY_DATABASE_URI, cache_size=app.config['GAME_CACHE_SIZE'])
+
+# Download necessary data from S3 and build the neighbor lookup once so requests only slice it
+if app.config['SIMILARITY_METHOD'] == 'top_k':
+    download_s3(app.config['LOCAL_NEIGHBORS_PATH'], app.config['BUCKET_NAME'], app.config['BUCKET_NEIGHBORS_PATH'])
+    neighbor_index = NeighborIndex.load(app.config['LOCAL_NEIGHBORS_PATH'])
+else:
+    download_s3(app.config['LOCAL_SIMILARITY_PATH'], app.config['BUCKET_NAME'], app.config['BUCKET_SIMILARITY_PATH'])
+    similarities = pd.read_csv(app.config['LOCAL_SIMILARITY_PATH'])
+    similarities = similarities.rename(columns={'Unnamed: 0': app.config['GAME_COLUMN']})
+    neighbor_index = NeighborIndex.from_similarity_df(similarities, app.config['GAME_COLUMN'],
+                                                      app.config['MAX_RECOMMENDATIONS'])
+    del similarities
 download_s3(app.config['LOCAL_GAMES_PATH'], app.config['BUCKET_NAME'], app.config['BUCKET_GAMES_PATH'])
-similarities = pd.read_csv(app.config['LOCAL_SIMILARITY_PATH'])
-similarities = similarities.rename(columns={'Unnamed: 0': app.config['GAME_COLUMN']})
-game_df = pd.read_csv(app.config['LOCAL_GAMES_PATH'])
+game_df = read_frame(app.config['LOCAL_GAMES_PATH'], [app.config['GAME_COLUMN'], app.config['TITLE_COLUMN']])
+name_index = GameNameIndex(game_df[app.config['TITLE_COLUMN']].fillna(''), game_df[app.config['GAME_COLUMN']])
+del game_df
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Adds the time spent in a block to the Server-Timing header of the response under `name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = g.setdefault('timings', {})
+        timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+
+@app.after_request
+def add_server_timing(response):
+    """Reports the time spent in the similarity lookup, the database and the template rendering of a request in the
+    Server-Timing header when SERVER_TIMING is enabled.
+    """
+    if app.config['SERVER_TIMING'] and 'timings' in g:
+        response.headers['Server-Timing'] = ', '.join('%s;dur=%.3f' % (name, seconds * 1000)
+                                                      for name, seconds in g.timings.items())
+    return response
 
 
 @app.route('/')
@@ -44,9 +82,11 @@ def index():
     """
 
     try:
-        games = game_manager.session.query(Games).order_by(Games.game_id).limit(app.config['MAX_ROWS_SHOW']).all()
+        with timed('db'):
+            games = game_manager.session.query(Games).order_by(Games.game_id).limit(app.config['MAX_ROWS_SHOW']).all()
         logger.debug("Index page accessed")
-        return render_template('index.html', games=games)
+        with timed('render'):
+            return render_template('index.html', games=games)
 
     except Exception:
         traceback.print_exc()
@@ -64,12 +104,13 @@ def show_cluster_or_id():
     # If game_id is provided => find the cluster for that game and return top 10 games by user rating in that cluster
     if request.form.get('game_id'):
         try:
-            results = list(similarities[[app.config['GAME_COLUMN'], str(request.form['game_id'])]].sort_values(
-                str(request.form['game_id']), ascending=False)[app.config['GAME_COLUMN']].iloc[1:app.config['MAX_RECOMMENDATIONS']+1])
-            games = game_manager.session.query(Games).filter(Games.game_id.in_(results)).limit(
-                app.config['MAX_RECOMMENDATIONS']).all()
+            with timed('lookup'):
+                results = neighbor_index.lookup(request.form['game_id'], app.config['MAX_RECOMMENDATIONS'])
+            with timed('db'):
+                games = game_manager.get_games(results)
             logger.debug("Returning %d games", app.config['MAX_RECOMMENDATIONS'])
-            return render_template('index.html', games=games)
+            with timed('render'):
+                return render_template('index.html', games=games)
         except Exception:
             traceback.print_exc()
             logger.warning("Not able to display games, error page returned")
@@ -77,22 +118,31 @@ def show_cluster_or_id():
 
     else:
         try:
-            game_id = int(
-                list(game_df[game_df['app_name'] == request.form.get('game_name')][app.config['GAME_COLUMN']])[
-                    0])
-
-            results = list(
-                similarities[[app.config['GAME_COLUMN'], str(game_id)]].sort_values(str(game_id), ascending=False)[
-                    app.config['GAME_COLUMN']].iloc[1:app.config['MAX_RECOMMENDATIONS']+1])
-            games = game_manager.session.query(Games).filter(Games.game_id.in_(results)).limit(
-                app.config['MAX_RECOMMENDATIONS']).all()
+            with timed('lookup'):
+                game_id = name_index.lookup(request.form.get('game_name'))
+                results = neighbor_index.lookup(game_id, app.config['MAX_RECOMMENDATIONS'])
+            with timed('db'):
+                games = game_manager.get_games(results)
             logger.debug("Returning %d games", app.config['MAX_RECOMMENDATIONS'])
-            return render_template('index.html', games=games)
+            with timed('render'):
+                return render_template('index.html', games=games)
         except Exception:
             traceback.print_exc()
             logger.warning("Not able to display games, error page returned")
             return render_template('error.html')
 
 
+@app.route('/autocomplete')
+def autocomplete():
+    """View that returns the games whose title starts with the `q` query parameter.
+    :return: JSON list of objects with the `id` and `title` of the matching games. The keys are fixed so the page does
+        not depend on the column names of the games table
+    """
+    limit = min(request.args.get('limit', app.config['AUTOCOMPLETE_LIMIT'], type=int), app.config['AUTOCOMPLETE_LIMIT'])
+    with timed('lookup'):
+        matches = name_index.complete(request.args.get('q', ''), limit)
+    return jsonify([{'id': game_id, 'title': title} for title, game_id in matches])
+
+
 if __name__ == '__main__':
     app.run(debug=app.config["DEBUG"], port=app.config["PORT"], host=app.config["HOST"])
@@ -0,0 +1,321 @@
+"""Load test of the Flask app with many concurrent clients.
+
+The app is started in a separate process against a local SQLite database and synthetic similarity artifacts, and
+`download_s3` is replaced by a stand-in that copies files from a local directory laid out like the S3 bucket, so no
+AWS credentials or network access are needed. Run from the root of the repository, for example:
+
+    python -m benchmarks.load_test --games 20000 --clients 32 --requests 5000 --mix index=1,game_id=5,game_name=4
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import logging.config
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.synthetic import synthetic_games
+from src.artifacts import write_frame
+from src.create_db import create_db, GameManager
+from src.model import top_k_neighbors
+from src.neighbors import write_neighbors
+
+logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
+logger = logging.getLogger(__name__)
+
+REQUEST_KINDS = ['index', 'game_id', 'game_name', 'autocomplete']
+COMPONENTS = ['lookup', 'db', 'render']
+BUCKET_NAME = '2021-msia423-faulkner-michael'
+
+
+def local_download_s3(bucket_dir):
+    """Creates a stand-in for `src.get_data.download_s3` that copies files from a local directory instead of S3
+    Args:
+        bucket_dir: obj:`String` Directory containing one folder per bucket, laid out like the buckets on S3
+    Returns:
+        obj:`Callable` Function with the same arguments as `download_s3`
+    """
+    def download_s3(unzipped_filepath, bucket_name, bucket_filepath):
+        shutil.copyfile(os.path.join(bucket_dir, bucket_name, bucket_filepath), unzipped_filepath)
+        logger.info('Data copied from %s to %s', bucket_filepath, unzipped_filepath)
+    return download_s3
+
+
+def prepare_app_data(work_dir, num_games, n_components, k, seed):
+    """Creates the synthetic games, neighbors file and SQLite database used by the app, and a settings file that
+    points the app to them
+    Args:
+        work_dir: obj:`String` Directory where the data is created
+        num_games: obj:`int` Number of games in the catalog
+        n_components: obj:`int` Size of the random game embeddings the neighbors are computed from
+        k: obj:`int` Number of neighbors saved for every game
+        seed: obj:`int` Seed of the random generator
+    Returns:
+        settings_filepath: obj:`String` Filepath to the settings file to set as APP_SETTINGS
+        games: obj:`pandas DataFrame` Games in the catalog
+    """
+    bucket_dir = os.path.join(work_dir, 'bucket')
+    for directory in ('results', 'processed'):
+        os.makedirs(os.path.join(bucket_dir, BUCKET_NAME, directory), exist_ok=True)
+    os.makedirs(os.path.join(work_dir, 'app'), exist_ok=True)
+
+    games = synthetic_games(num_games, seed)
+    write_frame(games, os.path.join(bucket_dir, BUCKET_NAME, 'processed', 'steam_games.parquet'))
+    embeddings = np.random.default_rng(seed).standard_normal((num_games, n_components)).astype(np.float32)
+    neighbors, scores = top_k_neighbors(embeddings, k, 1024)
+    write_neighbors(os.path.join(bucket_dir, BUCKET_NAME, 'results', 'neighbors.bin'), games['id'].tolist(),
+                    neighbors, scores)
+
+    engine_string = 'sqlite:///' + os.path.join(work_dir, 'app', 'games.db')
+    create_db(engine_string, True)
+    game_manager = GameManager(engine_string=engine_string)
+    game_manager.add_games(games, 'id', 'app_name', 'genres', 'release_date', 'url', 5000)
+    game_manager.close()
+
+    settings = {'SQLALCHEMY_DATABASE_URI': engine_string, 'SIMILARITY_METHOD': 'top_k', 'SERVER_TIMING': True,
+                'DEBUG': False, 'BUCKET_NAME': BUCKET_NAME, 'MAX_RECOMMENDATIONS': k,
+                'BUCKET_NEIGHBORS_PATH': 'results/neighbors.bin',
+                'LOCAL_NEIGHBORS_PATH': os.path.join(work_dir, 'app', 'neighbors.bin'),
+                'BUCKET_GAMES_PATH': 'processed/steam_games.parquet',
+                'LOCAL_GAMES_PATH': os.path.join(work_dir, 'app', 'steam_games.parquet')}
+    settings_filepath = os.path.join(work_dir, 'app', 'settings.py')
+    with open(settings_filepath, 'w') as f:
+        f.writelines('%s = %r\n' % item for item in settings.items())
+    return settings_filepath, games
+
+
+def serve(settings_filepath, bucket_dir, port, cache_size):
+    """Starts the app with the local stand-in for S3 and serves requests until the process is terminated
+    Args:
+        settings_filepath: obj:`String` Settings file created by `prepare_app_data`
+        bucket_dir: obj:`String` Directory used by the `download_s3` stand-in
+        port: obj:`int` Port the app listens on
+        cache_size: obj:`int` Number of games cached by the app, None to keep GAME_CACHE_SIZE from flaskconfig.py
+    Returns:
+        None
+    """
+    import src.get_data
+    from werkzeug.serving import make_server
+
+    os.environ['APP_SETTINGS'] = os.path.abspath(settings_filepath)
+    if cache_size is not None:
+        with open(settings_filepath, 'a') as f:
+            f.write('GAME_CACHE_SIZE = %d\n' % cache_size)
+    src.get_data.download_s3 = local_download_s3(bucket_dir)
+    from app import app
+
+    # Logging every request would be part of the measured latency
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def request_plan(games, mix, num_requests, seed):
+    """Creates the requests sent by the clients. Games are picked with a Zipf distribution, so popular games are
+    requested more often like on the real site, and some titles are typed in lower case.
+    Args:
+        games: obj:`pandas DataFrame` Games in the catalog
+        mix: obj:`Dict[String, float]` Relative weight of every kind of request in `REQUEST_KINDS`
+        num_requests: obj:`int` Number of requests
+        seed: obj:`int` Seed of the random generator
+    Returns:
+        obj:`List[Tuple[String, String]]` Kind and game id, title or prefix of every request
+    """
+    rng = np.random.default_rng(seed)
+    weights = np.array([mix.get(kind, 0) for kind in REQUEST_KINDS], dtype=float)
+    kinds = rng.choice(REQUEST_KINDS, num_requests, p=weights / weights.sum())
+    popularity = 1.0 / np.arange(1, len(games) + 1) ** 1.1
+    picks = rng.permutation(len(games))[rng.choice(len(games), num_requests, p=popularity / popularity.sum())]
+    ids = games['id'].to_numpy()[picks]
+    titles = games['app_name'].to_numpy()[picks]
+
+    plan = []
+    for kind, game_id, title in zip(kinds, ids, titles):
+        if kind == 'game_id':
+            plan.append((kind, str(game_id)))
+        elif kind == 'game_name':
+            plan.append((kind, title.lower() if rng.random() < 0.3 else title))
+        elif kind == 'autocomplete':
+            plan.append((kind, title[:rng.integers(1, 6)]))
+        else:
+            plan.append((kind, None))
+    return plan
+
+
+def send(session, url, kind, value):
+    """Sends one request and returns its latency and the server-side time breakdown
+    Args:
+        session: obj:`requests.Session` Session of the client
+        url: obj:`String` Base url of the app
+        kind: obj:`String` Kind of the request, one of `REQUEST_KINDS`
+        value: obj:`String` Game id, title or prefix sent with the request
+    Returns:
+        obj:`Dict` Kind, latency in milliseconds, status code and Server-Timing durations of the request
+    """
+    start = time.perf_counter()
+    try:
+        if kind == 'index':
+            response = session.get(url + '/')
+        elif kind == 'autocomplete':
+            response = session.get(url + '/autocomplete', params={'q': value})
+        else:
+            response = session.post(url + '/add', data={kind: value})
+        status = response.status_code
+        timings = _parse_server_timing(response.headers.get('Server-Timing', ''))
+        # The app answers failed lookups with the error page and a 200 status
+        if status == 200 and kind in ('game_id', 'game_name') and 'db' not in timings:
+            status = 'error page'
+    except requests.RequestException as e:
+        status, timings = type(e).__name__, {}
+    return {'kind': kind, 'latency_ms': (time.perf_counter() - start) * 1000, 'status': status, 'timings': timings}
+
+
+def run_load(url, plan, clients):
+    """Replays the requests from concurrent clients, each with its own session
+    Args:
+        url: obj:`String` Base url of the app
+        plan: obj:`List[Tuple[String, String]]` Requests created by `request_plan`
+        clients: obj:`int` Number of concurrent clients
+    Returns:
+        results: obj:`List[Dict]` Result of every request returned by `send`
+        elapsed: obj:`float` Wall time of the test in seconds
+    """
+    shares = [plan[client::clients] for client in range(clients)]
+
+    def client(requests_of_client):
+        with requests.Session() as session:
+            return [send(session, url, kind, value) for kind, value in requests_of_client]
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(clients) as executor:
+        results = [result for share in executor.map(client, shares) for result in share]
+    return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed):
+    """Computes the throughput, latency percentiles and average time breakdown overall and per kind of request
+    Args:
+        results: obj:`List[Dict]` Results returned by `run_load`
+        elapsed: obj:`float` Wall time of the test in seconds
+    Returns:
+        obj:`Dict` Summary of the load test
+    """
+    def stats(group):
+        latencies = np.array([result['latency_ms'] for result in group])
+        summary = {'requests': len(group), 'errors': sum(result['status'] != 200 for result in group),
+                   'mean_ms': round(float(latencies.mean()), 3)}
+        for percentile in (50, 95, 99):
+            summary['p%d_ms' % percentile] = round(float(np.percentile(latencies, percentile)), 3)
+        summary['breakdown_ms'] = {component: round(float(np.mean([result['timings'].get(component, 0)
+                                                                   for result in group])), 3)
+                                   for component in COMPONENTS}
+        return summary
+
+    by_kind = collections.defaultdict(list)
+    for result in results:
+        by_kind[result['kind']].append(result)
+
+    summary = stats(results)
+    summary.update({'elapsed_seconds': round(elapsed, 3), 'throughput_rps': round(len(results) / elapsed, 1),
+                    'by_kind': {kind: stats(group) for kind, group in by_kind.items()}})
+    return summary
+
+
+def _parse_server_timing(header):
+    """Reads the durations in milliseconds of a Server-Timing header such as 'lookup;dur=0.1, db;dur=1.2'"""
+    timings = {}
+    for metric in filter(None, (part.strip() for part in header.split(','))):
+        name, _, params = metric.partition(';')
+        if params.startswith('dur='):
+            timings[name] = float(params[4:])
+    return timings
+
+
+def _parse_mix(text):
+    """Reads a request mix such as 'index=1,game_id=5,game_name=4'"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError("Unknown request kind %s, choose from %s" % (kind, REQUEST_KINDS))
+        mix[kind] = float(weight)
+    return mix
+
+
+def _wait_until_ready(url, process, timeout):
+    """Waits for the app to answer requests"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not process.is_alive():
+            logger.error("The app stopped before it started serving requests")
+            sys.exit(3)
+        try:
+            requests.get(url + '/autocomplete', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    logger.error("The app at %s did not answer within %d seconds", url, timeout)
+    sys.exit(3)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Load test of the Flask app with concurrent clients")
+    parser.add_argument("--games", type=int, default=20000, help="Number of games in the synthetic catalog")
+    parser.add_argument("--neighbors", type=int, default=25, help="Neighbors saved for every game")
+    parser.add_argument("--cache_size", type=int, default=None,
+                        help="Number of games cached by the app, defaults to GAME_CACHE_SIZE")
+    parser.add_argument("--clients", type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests")
+    parser.add_argument("--warmup", type=int, default=100, help="Requests sent before measuring")
+    parser.add_argument("--mix", type=_parse_mix, default='index=1,game_id=5,game_name=4',
+                        help="Relative weight of each kind of request: %s" % ', '.join(REQUEST_KINDS))
+    parser.add_argument("--port", type=int, default=5055, help="Port of the app started by the load test")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data and requests")
+    parser.add_argument("--work_dir", help="Directory for the synthetic data, a temporary directory by default")
+    parser.add_argument("--output", help="Filepath where the summary is saved as json")
+
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='load_test_')
+    logger.info("Creating synthetic app data with %d games in %s", args.games, work_dir)
+    settings_filepath, games = prepare_app_data(work_dir, args.games, 30, args.neighbors, args.seed)
+
+    url = 'http://127.0.0.1:%d' % args.port
+    server = multiprocessing.get_context('fork').Process(
+        target=serve, args=(settings_filepath, os.path.join(work_dir, 'bucket'), args.port, args.cache_size),
+        daemon=True)
+    server.start()
+
+    try:
+        _wait_until_ready(url, server, 120)
+        plan = request_plan(games, args.mix, args.warmup + args.requests, args.seed)
+        if args.warmup:
+            run_load(url, plan[:args.warmup], args.clients)
+        results, elapsed = run_load(url, plan[args.warmup:], args.clients)
+    finally:
+        server.terminate()
+        server.join()
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = summarize(results, elapsed)
+    summary['options'] = {key: value for key, value in vars(args).items()}
+    logger.info("%d requests from %d clients in %.1f s: %.1f requests/s, %d errors", summary['requests'],
+                args.clients, elapsed, summary['throughput_rps'], summary['errors'])
+    for kind, stats in [('all', summary)] + sorted(summary['by_kind'].items()):
+        logger.info("%-12s p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms | lookup %.2f ms  db %.2f ms  render %.2f ms", kind,
+                    stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], stats['breakdown_ms']['lookup'],
+                    stats['breakdown_ms']['db'], stats['breakdown_ms']['render'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        logger.info("Load test summary was saved to %s", args.output)
@@ -0,0 +1,258 @@
+"""Times and memory-profiles the hot functions of the pipeline and the app on synthetic Steam-shaped data.
+
+Run from the root of the repository, for example:
+
+    python -m benchmarks.run_benchmarks --scales 10k 100k 1m --save benchmarks/baselines/local.json
+    python -m benchmarks.run_benchmarks --scales 10k 100k 1m --compare benchmarks/baselines/local.json
+
+Everything runs offline on generated data, nothing is downloaded from or uploaded to S3.
+"""
+import argparse
+import collections
+import json
+import logging.config
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import SCALES, synthetic_dataset
+from src import profiling
+from src.artifacts import write_frame
+from src.model import cosine_similarity_matrix, evaluate_model, top_k_neighbors
+from src.name_index import GameNameIndex
+from src.neighbors import NeighborIndex, write_neighbors
+from src.process_data import create_interaction_matrix, make_sparse, stream_interaction_matrix
+
+logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
+logger = logging.getLogger(__name__)
+
+# A benchmark prepares its inputs from the synthetic data and returns a function to time and the number of items that
+# function processes. Benchmarks are skipped above `max_interactions` unless --no_limits is given, since the legacy
+# dense code and the full similarity matrix do not fit in memory at the larger scales
+Benchmark = collections.namedtuple('Benchmark', ['prepare', 'max_interactions'])
+
+
+def _make_sparse(data, options):
+    def run():
+        for _ in make_sparse(data['user_games'], 'uid', 'id', 'owned', options.chunk_size):
+            pass
+    return run, len(data['user_games'])
+
+
+def _create_interaction_matrix(data, options):
+    item_names = os.path.join(data['tmp_dir'], 'item_names.txt')
+    return lambda: create_interaction_matrix(data['user_games'], 'uid', 'id', 'owned', item_names), \
+        len(data['user_games'])
+
+
+def _stream_interaction_matrix(data, options):
+    user_games_filepath = os.path.join(data['tmp_dir'], 'users_games.parquet')
+    if not os.path.exists(user_games_filepath):
+        write_frame(data['user_games'], user_games_filepath)
+    item_names = os.path.join(data['tmp_dir'], 'item_names.txt')
+    return lambda: stream_interaction_matrix(user_games_filepath, 'uid', 'id', 'owned', item_names,
+                                             options.chunk_size * 1000, data['tmp_dir']), len(data['user_games'])
+
+
+def _evaluate_model(data, options):
+    interactions = data['interactions']
+    return lambda: evaluate_model(interactions, 0.8, options.n_components, 'warp', options.epoch, options.n_jobs, 24), \
+        interactions.nnz * options.epoch
+
+
+def _cosine_similarity_matrix(data, options):
+    return lambda: cosine_similarity_matrix(data['embeddings'], data['item_names']), len(data['item_names'])
+
+
+def _top_k_neighbors(data, options):
+    return lambda: top_k_neighbors(data['embeddings'], 25, 1024), len(data['item_names'])
+
+
+def _neighbor_lookup(data, options):
+    neighbors_filepath = os.path.join(data['tmp_dir'], 'neighbors.bin')
+    neighbors, scores = top_k_neighbors(data['embeddings'], 25, 1024)
+    write_neighbors(neighbors_filepath, data['item_names'], neighbors, scores)
+    index = NeighborIndex.load(neighbors_filepath)
+    queries = np.random.default_rng(0).choice(data['item_names'], options.queries).tolist()
+
+    def run():
+        for game_id in queries:
+            index.lookup(game_id, 10)
+    return run, len(queries)
+
+
+def _name_lookup(data, options):
+    games = data['games']
+    index = GameNameIndex(games['app_name'], games['id'])
+    rng = np.random.default_rng(0)
+    titles = rng.choice(games['app_name'].to_numpy(), options.queries).tolist()
+    prefixes = [title[:rng.integers(1, 8)] for title in titles]
+
+    def run():
+        for title, prefix in zip(titles, prefixes):
+            index.lookup(title)
+            index.complete(prefix, 10)
+    return run, len(titles)
+
+
+BENCHMARKS = collections.OrderedDict([
+    ('make_sparse', Benchmark(_make_sparse, 100000)),
+    ('create_interaction_matrix', Benchmark(_create_interaction_matrix, None)),
+    ('stream_interaction_matrix', Benchmark(_stream_interaction_matrix, None)),
+    ('evaluate_model', Benchmark(_evaluate_model, 1000000)),
+    ('cosine_similarity_matrix', Benchmark(_cosine_similarity_matrix, 10000000)),
+    ('top_k_neighbors', Benchmark(_top_k_neighbors, None)),
+    ('neighbor_lookup', Benchmark(_neighbor_lookup, None)),
+    ('name_lookup', Benchmark(_name_lookup, None)),
+])
+
+
+def run_benchmarks(scales, names, options):
+    """Runs the benchmarks at every scale and returns their timings
+    Args:
+        scales: obj:`List[String]` Names of the scales in `SCALES`
+        names: obj:`List[String]` Names of the benchmarks in `BENCHMARKS`
+        options: obj:`argparse.Namespace` Parsed command line options
+    Returns:
+        obj:`Dict[String, Dict]` Timing record of every benchmark, keyed by benchmark@scale
+    """
+    results = collections.OrderedDict()
+    profiling.enable()
+    for scale in scales:
+        logger.info("Generating the %s dataset", scale)
+        games, user_games = synthetic_dataset(scale, options.seed)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            item_names = os.path.join(tmp_dir, 'item_names.txt')
+            data = {'games': games, 'user_games': user_games, 'tmp_dir': tmp_dir,
+                    'interactions': create_interaction_matrix(user_games, 'uid', 'id', 'owned', item_names)}
+            data['item_names'] = sorted(user_games['id'].unique().tolist())
+            data['embeddings'] = np.random.default_rng(options.seed).standard_normal(
+                (len(data['item_names']), options.n_components)).astype(np.float32)
+
+            for name in names:
+                benchmark = BENCHMARKS[name]
+                if benchmark.max_interactions and len(user_games) > benchmark.max_interactions \
+                        and not options.no_limits:
+                    logger.info("Skipping %s at scale %s, use --no_limits to run it", name, scale)
+                    continue
+
+                runs = []
+                for _ in range(options.repeat):
+                    run, items = benchmark.prepare(data, options)
+                    profiling.collect()
+                    with profiling.step(name, items):
+                        run()
+                    runs.append(profiling.collect()[-1])
+                best = min(runs, key=lambda record: record['wall_seconds'])
+                result = {key: best[key] for key in (
+                    'wall_seconds', 'cpu_seconds', 'peak_rss_mb', 'rss_increase_mb', 'items', 'items_per_second')}
+
+                # The resident memory includes memory freed earlier but kept by the allocator, so the memory
+                # allocated by the benchmark itself is traced in a separate run that is not timed
+                run, _ = benchmark.prepare(data, options)
+                tracemalloc.start()
+                run()
+                result['peak_alloc_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                tracemalloc.stop()
+
+                results['%s@%s' % (name, scale)] = result
+                logger.info("%s@%s: %.3f s wall, %.3f s cpu, %.1f MB allocated, %s items/s", name, scale,
+                            result['wall_seconds'], result['cpu_seconds'], result['peak_alloc_mb'],
+                            result['items_per_second'])
+    profiling.disable()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Logs how every benchmark changed compared to a baseline
+    Args:
+        results: obj:`Dict[String, Dict]` Timings returned by `run_benchmarks`
+        baseline: obj:`Dict[String, Dict]` Timings of an earlier run
+        tolerance: obj:`float` Relative increase of wall time or memory reported as a regression, e.g. 0.25 for 25%.
+            Increases under 10 milliseconds or 8 MB are ignored as noise
+    Returns:
+        obj:`List[String]` Benchmarks that regressed
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        time_ratio = result['wall_seconds'] / max(before['wall_seconds'], 1e-9)
+        regressed = result['wall_seconds'] > before['wall_seconds'] * (1 + tolerance) + 0.01 or \
+            result['peak_alloc_mb'] > before['peak_alloc_mb'] * (1 + tolerance) + 8
+        (logger.warning if regressed else logger.info)(
+            "%s: wall time %.3f s -> %.3f s (x%.2f), allocated %.1f MB -> %.1f MB", key, before['wall_seconds'],
+            result['wall_seconds'], time_ratio, before['peak_alloc_mb'], result['peak_alloc_mb'])
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def _commit():
+    """Returns the current git commit, or None outside of a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode()\
+            .strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline and the app on synthetic data")
+    parser.add_argument("--scales", nargs='+', default=['10k', '100k'], choices=list(SCALES),
+                        help="Dataset sizes to run, by number of interactions")
+    parser.add_argument("--benchmarks", nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS),
+                        help="Benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each benchmark, the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--chunk_size", type=int, default=1000, help="Users per chunk of make_sparse, the streaming "
+                                                                     "benchmark reads 1000 times as many rows")
+    parser.add_argument("--n_components", type=int, default=30, help="Size of the embeddings")
+    parser.add_argument("--epoch", type=int, default=5, help="Epochs of the model trained by evaluate_model")
+    parser.add_argument("--n_jobs", type=int, default=1, help="Threads used by the model")
+    parser.add_argument("--queries", type=int, default=10000, help="Lookups made by the app benchmarks")
+    parser.add_argument("--no_limits", action='store_true',
+                        help="Run every benchmark at every scale, even the ones that need a lot of memory")
+    parser.add_argument("--save", help="Filepath where the results are saved as a json baseline")
+    parser.add_argument("--compare", help="Filepath to a saved baseline to compare the results to")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative increase of time or memory reported as a regression")
+
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.benchmarks, args)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({'commit': _commit(), 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                                   'cpu_count': os.cpu_count()},
+                       'options': vars(args), 'results': results}, f, indent=2)
+        logger.info("Benchmark results were saved to %s", args.save)
+
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+
+        except FileNotFoundError:
+            logger.error("Could not find baseline %s, save one on this machine first with --save", args.compare)
+            sys.exit(3)
+
+        # Timings are only comparable on the machine that recorded the baseline
+        machine = {'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+        if any(baseline.get('machine', {}).get(key) != value for key, value in machine.items()):
+            logger.warning("The baseline was recorded on another machine (%s), the timings may differ for reasons "
+                           "other than the code", baseline.get('machine'))
+        logger.info("Comparing to the baseline of commit %s", baseline.get('commit'))
+        if compare(results, baseline['results'], args.tolerance):
+            sys.exit(1)
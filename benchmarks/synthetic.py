@@ -0,0 +1,103 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Number of interactions, users and games of each benchmark scale. Users own about 35 to 50 games on average and the
+# catalog grows towards the size of the Steam store
+SCALES = {
+    '10k': (10000, 300, 500),
+    '100k': (100000, 2500, 2000),
+    '1m': (1000000, 25000, 5000),
+    '10m': (10000000, 250000, 15000),
+    '50m': (50000000, 1000000, 30000),
+}
+
+WORDS = ['age', 'battle', 'castle', 'dark', 'dragon', 'empire', 'farm', 'galaxy', 'hero', 'island', 'kingdom',
+         'legend', 'magic', 'night', 'ocean', 'planet', 'quest', 'racing', 'shadow', 'space', 'tower', 'war', 'world',
+         'zombie']
+GENRES = ['Action', 'Adventure', 'Casual', 'Indie', 'RPG', 'Racing', 'Simulation', 'Sports', 'Strategy']
+
+
+def synthetic_games(num_games, seed=0):
+    """
+    Creates a games dataframe shaped like the processed steam_games data. Game ids are increasing with random gaps
+    like Steam app ids, and titles are made of a few common words so that prefixes match several games.
+    Args:
+        num_games: obj:`int` Number of games to create
+        seed: obj:`int` Seed of the random generator, the same seed always creates the same games
+    Returns:
+        games :obj:`pandas DataFrame` Dataframe with the id, app_name, genres, release_date and url columns
+    """
+    rng = np.random.default_rng(seed)
+    ids = (10 + np.cumsum(rng.integers(1, 20, num_games))).astype(np.int32)
+    first = rng.choice(WORDS, num_games)
+    second = rng.choice(WORDS, num_games)
+    titles = [f'{a.title()} {b.title()} {i}' for i, (a, b) in enumerate(zip(first, second))]
+    genres = [str(list(rng.choice(GENRES, rng.integers(1, 4), replace=False))) for _ in range(num_games)]
+    years = rng.integers(2000, 2021, num_games)
+
+    return pd.DataFrame({'id': ids, 'app_name': titles, 'genres': genres,
+                         'release_date': [f'{year}-01-01' for year in years],
+                         'url': [f'http://store.steampowered.com/app/{game_id}/' for game_id in ids]})
+
+
+def synthetic_user_games(num_interactions, num_users, game_ids, seed=0, item_exponent=1.1, user_exponent=1.5):
+    """
+    Creates a long user_games dataframe with power-law ownership. Game popularity follows a Zipf distribution over a
+    random ranking of the games and the number of games per user follows a Pareto distribution, so a few games are
+    owned by most users and a few users own a large part of the catalog, like the Steam data. Duplicated user/game
+    pairs are removed, so the result has exactly `num_interactions` rows unless there are not enough possible pairs.
+    Args:
+        num_interactions: obj:`int` Number of user/game pairs to create
+        num_users: obj:`int` Number of users
+        game_ids: obj:`Numpy Array` IDs of the games that users can own
+        seed: obj:`int` Seed of the random generator, the same arguments always create the same data
+        item_exponent: obj:`float` Exponent of the Zipf distribution of game popularity
+        user_exponent: obj:`float` Shape of the Pareto distribution of user activity, smaller is more skewed
+    Returns:
+        user_games :obj:`pandas DataFrame` Dataframe with int32 uid and id columns and a float owned column, sorted by
+            user and game
+    """
+    rng = np.random.default_rng(seed)
+    game_ids = np.asarray(game_ids, dtype=np.int32)
+    num_games = len(game_ids)
+    num_interactions = min(num_interactions, num_users * num_games)
+
+    popularity = 1.0 / np.arange(1, num_games + 1) ** item_exponent
+    popularity = popularity[rng.permutation(num_games)]
+    activity = rng.pareto(user_exponent, num_users) + 1
+    item_cdf = np.cumsum(popularity / popularity.sum())
+    user_cdf = np.cumsum(activity / activity.sum())
+
+    keys = np.empty(0, dtype=np.int64)
+    while len(keys) < num_interactions:
+        size = int((num_interactions - len(keys)) * 1.2) + 1000
+        users = np.searchsorted(user_cdf, rng.random(size), side='right').clip(max=num_users - 1)
+        items = np.searchsorted(item_cdf, rng.random(size), side='right').clip(max=num_games - 1)
+        keys = np.union1d(keys, users.astype(np.int64) * num_games + items)
+        logger.debug("Created %d of %d unique user/game pairs", min(len(keys), num_interactions), num_interactions)
+
+    if len(keys) > num_interactions:
+        keys = np.sort(rng.choice(keys, num_interactions, replace=False))
+
+    return pd.DataFrame({'uid': (keys // num_games).astype(np.int32), 'id': game_ids[keys % num_games],
+                         'owned': np.ones(len(keys))})
+
+
+def synthetic_dataset(scale, seed=0):
+    """
+    Creates the games and user_games data of a benchmark scale
+    Args:
+        scale: obj:`String` Name of a scale in `SCALES`, e.g. '1m'
+        seed: obj:`int` Seed of the random generator
+    Returns:
+        games :obj:`pandas DataFrame` Games data created by `synthetic_games`
+        user_games :obj:`pandas DataFrame` Long user_games data created by `synthetic_user_games`
+    """
+    num_interactions, num_users, num_games = SCALES[scale]
+    games = synthetic_games(num_games, seed)
+    user_games = synthetic_user_games(num_interactions, num_users, games['id'].to_numpy(), seed)
+    return games, user_games
@@ -8,11 +8,18 @@ HOST = "0.0.0.0"
 SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed
 MAX_ROWS_SHOW = 50
 MAX_RECOMMENDATIONS = 25
+GAME_CACHE_SIZE = 10000  # Number of games whose information is kept in memory
 GAME_COLUMN = 'id'
+TITLE_COLUMN = 'app_name'
+AUTOCOMPLETE_LIMIT = 10
+SERVER_TIMING = False  # If true, responses report the time spent in lookup, database and rendering
+SIMILARITY_METHOD = 'top_k'  # Must match `model.similarity.method` in config.yaml
+BUCKET_NEIGHBORS_PATH = 'results/neighbors.bin'
+LOCAL_NEIGHBORS_PATH = 'data/results/neighbors.bin'
 BUCKET_SIMILARITY_PATH = 'results/similarities.csv'
 LOCAL_SIMILARITY_PATH = 'data/results/similarities.csv'
-BUCKET_GAMES_PATH = 'processed/steam_games.csv'
-LOCAL_GAMES_PATH = 'data/processed/steam_games.csv'
+BUCKET_GAMES_PATH = 'processed/steam_games.parquet'
+LOCAL_GAMES_PATH = 'data/processed/steam_games.parquet'
 BUCKET_NAME = '2021-msia423-faulkner-michael'
 
 # Connection string
@@ -1,17 +1,14 @@
 import argparse
 import logging.config
-import pickle
-import sys
 
-import pandas as pd
 import yaml
 
 from config.flaskconfig import SQLALCHEMY_DATABASE_URI
 from src.create_db import create_db
-from src.get_data import download, upload, download_s3
+from src.get_data import download, upload
 from src.ingest_data import ingest_data
-from src.model import run_model, cosine_similarity_matrix, evaluate_model
-from src.process_data import create_games_csv, create_user_games_csv, create_interaction_matrix, json_generator
+from src.pipeline import run_pipeline
+from src.tune import tune
 
 logging.config.fileConfig("config/logging/local.conf", disable_existing_loggers=False)
 logger = logging.getLogger(__name__)
@@ -20,10 +17,22 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description="")
     parser.add_argument("task", help="Part of the Pipeline to run", choices=['create_db', 'get_data', 'process_data',
-                                                                             'ingest', 'model', 'full'])
+                                                                             'ingest', 'model', 'full', 'tune'])
     parser.add_argument("--engine_string", default=SQLALCHEMY_DATABASE_URI,
                         help="SQLAlchemy connection URI for database")
     parser.add_argument("--config_file", default='config/config.yaml', help='Path to configuration file')
+    parser.add_argument("--no_cache", action='store_true',
+                        help="Run every stage even if its inputs and configuration are unchanged")
+    parser.add_argument("--profile", action='store_true',
+                        help="Save the wall time, CPU time, peak memory and throughput of every stage to a json report")
+    parser.add_argument("--cprofile", action='store_true',
+                        help="Also save a cProfile dump of every stage, implies --profile")
+    parser.add_argument("--max_workers", "--max-workers", type=int, default=None,
+                        help="Maximum number of pipeline stages that run at the same time, defaults to "
+                             "pipeline_max_workers in the configuration file")
+    parser.add_argument("--incremental", action='store_true',
+                        help="Update the saved model with the new users, games and interactions instead of training a "
+                             "new one, and skip the evaluation")
 
     args = parser.parse_args()
 
@@ -32,6 +41,16 @@ if __name__ == '__main__':
     with open(args.config_file, "r") as f:
         config = yaml.load(f, Loader=yaml.FullLoader)
 
+    max_workers = args.max_workers or config['pipeline_max_workers']
+    process_stages = ['download_games', 'download_users', 'process_games', 'parse_users', 'process_users']
+    model_stages = ['interactions', 'evaluate', 'train', 'similarity']
+    if args.incremental:
+        config['model']['model_store']['incremental'] = True
+    if config['model']['model_store']['incremental']:
+        model_stages.remove('evaluate')
+    options = {'use_cache': not args.no_cache, 'max_workers': max_workers, 'profile': args.profile or args.cprofile,
+               'cprofile': args.cprofile}
+
     if task == 'create_db':
         logger.debug("Running database creation portion of model pipeline")
         create_db(args.engine_string, config['create_db']['remove_old'])
@@ -45,202 +64,23 @@ if __name__ == '__main__':
 
     elif task == 'process_data':
         logger.debug("Running process portion of model pipeline")
-        download_s3(**config['process_data']['steam_game_data']['s3_download'])
-        download_s3(**config['process_data']['steam_user_data']['s3_download'])
-        logger.debug("Creating csv from json for the Steam games data")
-        try:
-            games_df = pd.read_json(config['process_data']['steam_game_data']['input'])
-
-        except FileNotFoundError:
-            logger.error("Could not find file %s, make sure the path name is correct",
-                         config['process_data']['steam_game_data']['input'])
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        games_df = create_games_csv(games_df, **config['process_data']['steam_game_data']['create_games_csv'])
-        games_df.to_csv(config['process_data']['steam_game_data']['output'])
-        logger.info("Games data has been processed successfully and can be found at %s",
-                    config['process_data']['steam_game_data']['output'])
-        upload(**config['process_data']['steam_game_data']['upload'])
-        logger.debug("Creating csv from json for the Steam user owned games data")
-
-        user_games_df = []
-        logger.debug("Converting json to Dataframe with generator function")
-        try:
-            for json_line in json_generator(config['process_data']['steam_user_data']['input']):
-                user_games_df.append(json_line)
-
-        except FileNotFoundError:
-            logger.error("Could not find file %s, make sure the path name is correct",
-                         config['process_data']['steam_user_data']['input'])
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        user_games_df = pd.DataFrame(user_games_df)
-        user_games_df = create_user_games_csv(user_games_df, games_df,
-                                              **config['process_data']['steam_user_data']['create_users_games_csv'])
-        user_games_df.to_csv(config['process_data']['steam_user_data']['output'])
-        logger.info("User_Games data has been processed successfully and can be found at %s",
-                    config['process_data']['steam_user_data']['output'])
+        run_pipeline(config, args.engine_string, process_stages, **options)
 
     elif task == 'ingest':
         ingest_data(args.engine_string, **config['ingest'])
 
     elif task == 'model':
         logger.debug("Running model portion of model pipeline")
-        try:
-            user_games_df = pd.read_csv(config['model']['only']['user_games_path'])
-
-        except FileNotFoundError:
-            logger.error("Could not find file %s, make sure the path name is correct",
-                         config['process_data']['steam_user_data']['input'])
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        interactions = create_interaction_matrix(user_games_df, **config['model']['interactions'])
-        logger.info("Training and Evaluating LightFM Model")
-        test_auc = evaluate_model(interactions, **config['model']['evaluate_model'])
-        logger.info("Test set had AUC score of %s", str(test_auc))
-
-        try:
-            with open(config['model']['filepaths']['auc_txt'], 'w') as f:
-                f.write(str(test_auc))
-
-        except OSError:
-            logger.error("Could not open: %s", f)
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        logger.info("Training LightFM model on full dataset")
-        model = run_model(interactions, **config['model']['run_model'])
-        logger.debug("Creating cosine similarity matrix")
-
-        try:
-            with open(config['model']['filepaths']['item_names'], 'rb') as f:
-                item_names = pickle.load(f)
-
-        except FileNotFoundError as e:
-            logger.error("File containing the game ids was not found, please rerun the model section to create the "
-                         "file")
-            sys.exit(3)
-
-        cosine_matrix = cosine_similarity_matrix(model.item_embeddings, item_names)
-        cosine_matrix.to_csv(config['model']['filepaths']['cosine_matrix'])
-        logger.info("Cosine similarity dataframe was created successfully and saved to %s",
-                    config['model']['filepaths']['cosine_matrix'])
-        upload(**config['model']['upload'])
+        run_pipeline(config, args.engine_string, model_stages, **options)
+
+    elif task == 'tune':
+        logger.debug("Running hyperparameter search of the model")
+        tune(config['model']['filepaths']['interactions'], config['model']['run_model'], **config['tune'])
 
     elif task == 'full':
         logger.debug("Running full model pipeline")
-        download_s3(**config['process_data']['steam_game_data']['s3_download'])
-        download_s3(**config['process_data']['steam_user_data']['s3_download'])
-        logger.debug("Creating csv from json for the Steam games data")
-
-        try:
-            games_df = pd.read_json(config['process_data']['steam_game_data']['input'])
-
-        except FileNotFoundError:
-            logger.error("Could not find file %s, make sure the path name is correct",
-                         config['process_data']['steam_game_data']['input'])
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        games_df = create_games_csv(games_df, **config['process_data']['steam_game_data']['create_games_csv'])
-        games_df.to_csv(config['process_data']['steam_game_data']['output'])
-        logger.info("Games data has been processed successfully and can be found at %s",
-                    config['process_data']['steam_game_data']['output'])
-        upload(**config['process_data']['steam_game_data']['upload'])
-
-        logger.debug("Creating csv from json for the Steam user owned games data")
-        user_games_df = []
-        logger.debug("Converting json to Dataframe with generator function")
-
-        try:
-            for json_line in json_generator(config['process_data']['steam_user_data']['input']):
-                user_games_df.append(json_line)
-
-        except FileNotFoundError:
-            logger.error("Could not find file %s, make sure the path name is correct",
-                         config['process_data']['steam_user_data']['input'])
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        user_games_df = pd.DataFrame(user_games_df)
-        user_games_df = create_user_games_csv(user_games_df, games_df,
-                                              **config['process_data']['steam_user_data']['create_users_games_csv'])
-        user_games_df.to_csv(config['process_data']['steam_user_data']['output'])
-        logger.info("User_Games data has been processed successfully and can be found at %s",
-                    config['process_data']['steam_user_data']['output'])
-
-        logger.debug("Creating parse matrix containing interactions between users and games")
-
-        try:
-            user_games_df = pd.read_csv(config['model']['only']['user_games_path'])
-
-        except FileNotFoundError:
-            logger.error("Could not find file %s, make sure the path name is correct",
-                         config['process_data']['steam_user_data']['input'])
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        interactions = create_interaction_matrix(user_games_df, **config['model']['interactions'])
-        logger.info("Training and Evaluating LightFM Model")
-        test_auc = evaluate_model(interactions, **config['model']['evaluate_model'])
-        logger.info("Test set had AUC score of %s", str(test_auc))
-
-        try:
-            with open(config['model']['filepaths']['auc_txt'], 'w') as f:
-                f.write(str(test_auc))
-
-        except OSError:
-            logger.error("Could not open: %s", f)
-            sys.exit(3)
-
-        except Exception as e:
-            logger.error(e)
-            sys.exit(3)
-
-        logger.info("Training LightFM model on full dataset")
-        model = run_model(interactions, **config['model']['run_model'])
-        logger.debug("Creating cosine similarity matrix")
-
-        try:
-            with open(config['model']['filepaths']['item_names'], 'rb') as f:
-                item_names = pickle.load(f)
-
-        except FileNotFoundError as e:
-            logger.error("File containing the game ids was not found, please rerun the model section to create the "
-                         "file")
-            sys.exit(3)
-
-        cosine_matrix = cosine_similarity_matrix(model.item_embeddings, item_names)
-        cosine_matrix.to_csv(config['model']['filepaths']['cosine_matrix'])
-        logger.info("Cosine similarity dataframe was created successfully and saved to %s",
-                    config['model']['filepaths']['cosine_matrix'])
-        upload(**config['model']['upload'])
-
+        stages = process_stages + model_stages
         if config['pipeline_with_ingest']:
-            ingest_data(args.engine_string, **config['ingest'])
-
+            stages.append('ingest')
+        run_pipeline(config, args.engine_string, stages, **options)
         logger.info('Finished Pipeline')
@@ -0,0 +1,120 @@
+import logging
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from src import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def _extension(filepath):
+    """Returns the lower case extension of a filepath, which selects the format of a data artifact"""
+    return os.path.splitext(filepath)[1].lower()
+
+
+def write_frame(df, filepath, dtypes=None):
+    """
+    Saves a dataframe in the format given by the extension of `filepath`. Parquet (.parquet) and numpy archives (.npz,
+    only for numeric columns) are columnar binary formats, anything else is saved as csv without the index.
+    Args:
+        df: obj:`pandas DataFrame` Dataframe to save
+        filepath: obj:`String` Filepath to where the dataframe is saved
+        dtypes: obj:`Dict[String, String]` Column types to cast to before saving, e.g. to store ids as int32
+    Returns:
+        None
+    """
+    if dtypes:
+        df = df.astype(dtypes)
+
+    extension = _extension(filepath)
+    with profiling.step('write_frame', len(df)):
+        if extension == '.parquet':
+            df.to_parquet(filepath, index=False)
+        elif extension == '.npz':
+            np.savez(filepath, **{column: df[column].to_numpy() for column in df.columns})
+        else:
+            df.to_csv(filepath, index=False)
+    logger.debug("Saved %d rows to %s", len(df), filepath)
+
+
+def read_frame(filepath, columns=None, dtypes=None):
+    """
+    Reads a dataframe saved by `write_frame`, or any csv file, picking the format from the extension of `filepath`.
+    Only the requested columns are read from disk.
+    Args:
+        filepath: obj:`String` Filepath to where the dataframe is saved
+        columns: obj:`List[String]` Columns to read, all columns are read if not given
+        dtypes: obj:`Dict[String, String]` Column types used when parsing a csv file
+    Returns:
+        df: obj:`pandas DataFrame` Dataframe read from the file
+    """
+    extension = _extension(filepath)
+    if extension == '.parquet':
+        return pd.read_parquet(filepath, columns=columns)
+    if extension == '.npz':
+        with np.load(filepath) as f:
+            return pd.DataFrame({column: f[column] for column in (columns or f.files)})
+    return pd.read_csv(filepath, usecols=columns, dtype=dtypes)
+
+
+def iter_frame_chunks(filepath, columns, chunk_size, dtypes=None):
+    """
+    Generator function that yields a dataframe saved by `write_frame`, or any csv file, in chunks of at most
+    `chunk_size` rows containing only the requested columns. Numpy archives can not be read partially, so their
+    columns are loaded whole before being split.
+    Args:
+        filepath: obj:`String` Filepath to where the dataframe is saved
+        columns: obj:`List[String]` Columns to read
+        chunk_size: obj:`int` Maximum number of rows in each chunk
+        dtypes: obj:`Dict[String, String]` Column types of the chunks
+    """
+    extension = _extension(filepath)
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(filepath).iter_batches(batch_size=chunk_size, columns=columns):
+            chunk = batch.to_pandas()
+            yield chunk.astype(dtypes) if dtypes else chunk
+    elif extension == '.npz':
+        df = read_frame(filepath, columns)
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start:start + chunk_size]
+            yield chunk.astype(dtypes) if dtypes else chunk
+    else:
+        yield from pd.read_csv(filepath, usecols=columns, dtype=dtypes, chunksize=chunk_size)
+
+
+def count_rows(filepath):
+    """
+    Counts the rows of a dataframe saved by `write_frame`, or any csv file, without loading it. Parquet files store
+    the count in their metadata, numpy archives in the header of every column and csv files are scanned for line
+    breaks, assuming no quoted field contains one.
+    Args:
+        filepath: obj:`String` Filepath to where the dataframe is saved
+    Returns:
+        obj:`int` Number of rows
+    """
+    extension = _extension(filepath)
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(filepath).metadata.num_rows
+    if extension == '.npz':
+        with zipfile.ZipFile(filepath) as archive:
+            with archive.open(archive.namelist()[0]) as f:
+                version = np.lib.format.read_magic(f)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) \
+                    else np.lib.format.read_array_header_2_0
+                shape, _, _ = read_header(f)
+        return shape[0]
+
+    lines = 0
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1048576), b''):
+            lines += block.count(b'\n')
+            last = block
+    # The header is not a row and the last line may not end with a line break
+    return max(lines - 1 + (lines > 0 and not last.endswith(b'\n')), 0)
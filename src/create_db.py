@@ -1,23 +1,32 @@
 import logging
 import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
 
+import pandas as pd
 import pymysql.err
 import sqlalchemy
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, bindparam
 from sqlalchemy.orm import sessionmaker
 
 logger = logging.getLogger(__name__)
 
 base = declarative_base()
 
+GAME_FIELDS = ['game_id', 'title', 'genre', 'release_date', 'url']
+
+# Read-only copy of a row of the Games table that stays valid after the session that loaded it is closed
+GameRecord = namedtuple('GameRecord', GAME_FIELDS)
+
 
 class Games(base):
     """Create a data model for the database to be set up for capturing games"""
     __tablename__ = 'Games'
     id = Column(Integer, primary_key=True)
-    game_id = Column(Integer, unique=False)
+    game_id = Column(Integer, unique=False, index=True)
     title = Column(String(100), unique=False)
     genre = Column(String(100), unique=False)
     release_date = Column(String(100), unique=False)
@@ -30,7 +39,8 @@ class Games(base):
 def create_db(engine_string, remove_old):
     """Creates a database at the specified engine_string that contains the data models inherited by `Base`. This
         function does not return anything, instead it creates a database instance at the specified location that
-        contains the Games, Players, and OwnedGames tables.
+        contains the Games, Players, and OwnedGames tables. Indexes missing from tables created by an older version of
+        the data models are added, so running this function again migrates an existing database.
     Args:
         engine_string: obj:`String` Defines the connection to the SQL database
         remove_old: obj:`Boolean` Specifies whether the old table should be deleted to avoid adding duplicates
@@ -46,6 +56,7 @@ def create_db(engine_string, remove_old):
             base.metadata.drop_all(engine)
         base.metadata.create_all(engine)
         logger.info("Tables have been created at %s", engine_string)
+        create_missing_indexes(engine)
 
     except pymysql.err.OperationalError as e:
         logger.error(e, "Could not connect to the mysql server. Make sure you are on the Northwestern VPN before "
@@ -57,15 +68,60 @@ def create_db(engine_string, remove_old):
         sys.exit(3)
 
 
+def create_missing_indexes(engine):
+    """Adds the indexes defined on the data models that do not exist yet in the database, since `create_all` only
+        creates indexes together with new tables.
+    Args:
+        engine: obj:`sqlalchemy.engine.Engine` Engine connected to the SQL database
+    Returns:
+        None
+    """
+    inspector = sqlalchemy.inspect(engine)
+    for table in base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+                logger.info("Created index %s on table %s", index.name, table.name)
+
+
+def games_table_state(engine_string):
+    """Returns the number of rows and the largest id of the Games table, which change whenever the table is dropped,
+        recreated or written to.
+    Args:
+        engine_string: obj:`String` Defines the connection to the SQL database
+    Returns:
+        obj:`Dict` Number of rows and largest id, or None if the table could not be read
+    """
+    try:
+        engine = sqlalchemy.create_engine(engine_string)
+        try:
+            with engine.connect() as connection:
+                rows, max_id = connection.execute(sqlalchemy.select([sqlalchemy.func.count(Games.id),
+                                                                     sqlalchemy.func.max(Games.id)])).first()
+        finally:
+            engine.dispose()
+
+    except Exception as e:
+        logger.warning("%s, could not read the state of the Games table", e)
+        return None
+
+    return {'rows': rows, 'max_id': max_id}
+
+
 class GameManager:
     """Manager for database session that allows the addition of new games to the database"""
 
-    def __init__(self, app=None, engine_string=None):
+    def __init__(self, app=None, engine_string=None, cache_size=0):
         """
         Args:
             app: Flask - Flask app
             engine_string: str - Engine string pointing to the local or RDS database
+            cache_size: int - Number of games kept in memory by `get_games`
         """
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
         if app:
             self.db = SQLAlchemy(app)
             self.session = self.db.session
@@ -97,3 +153,135 @@ class GameManager:
         game = Games(game_id=int(game_id), title=title, genre=genre, release_date=release_date, url=url)
         session.add(game)
         session.commit()
+
+    def get_games(self, game_ids):
+        """Returns the games with the given ids in the same order. Games are served from a least recently used cache
+        when possible and the others are fetched with a single query.
+        Args:
+            game_ids :obj:`List[int]` IDs given to the games by Steam
+        Returns:
+            obj:`List[GameRecord]` Games that were found in the database
+        """
+        game_ids = [int(game_id) for game_id in game_ids]
+        with self.cache_lock:
+            found = {game_id: self.cache[game_id] for game_id in game_ids if game_id in self.cache}
+            for game_id in found:
+                self.cache.move_to_end(game_id)
+
+        missing = [game_id for game_id in game_ids if game_id not in found]
+        if missing:
+            columns = [getattr(Games, field) for field in GAME_FIELDS]
+            rows = self.session.query(*columns).filter(Games.game_id.in_(missing)).order_by(Games.id).all()
+            fetched = {}
+            for row in rows:
+                fetched.setdefault(row.game_id, GameRecord(*row))
+            found.update(fetched)
+            logger.debug("Fetched %d games from the database, %d served from cache", len(fetched),
+                         len(game_ids) - len(missing))
+
+            if self.cache_size > 0:
+                with self.cache_lock:
+                    self.cache.update(fetched)
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+
+        return [found[game_id] for game_id in game_ids if game_id in found]
+
+    def add_games(self, games, game_id_column, game_name_column, genres_column, release_date_column, url_column,
+                  batch_size):
+        """Adds every game in a dataframe to the Games table. Rows are inserted with one executemany insert and one
+        commit per batch instead of one transaction per game.
+        Args:
+            games :obj:`pandas DataFrame` Dataframe containing the Steam game information
+            game_id_column :obj:`String` column name where the game id is stored
+            game_name_column :obj:`String` column name where the game name is stored
+            genres_column :obj:`String` column name where the genre is stored
+            release_date_column :obj:`String` column name where the release date is stored
+            url_column :obj:`String` column name where the url is stored
+            batch_size :obj:`int` Number of games inserted per transaction
+        Returns:
+            obj:`int` Number of games added
+        """
+        rows = _game_rows(games, game_id_column, game_name_column, genres_column, release_date_column, url_column)
+
+        session = self.session
+        insert = Games.__table__.insert()
+        start = time.perf_counter()
+        for batch_start in range(0, len(rows), batch_size):
+            session.execute(insert, rows.iloc[batch_start:batch_start + batch_size].to_dict('records'))
+            session.commit()
+            logger.debug("Added games %d to %d", batch_start, min(batch_start + batch_size, len(rows)))
+
+        elapsed = time.perf_counter() - start
+        logger.info("Added %d games in %.2f seconds (%.0f rows/s)", len(rows), elapsed,
+                    len(rows) / elapsed if elapsed > 0 else 0)
+        return len(rows)
+
+    def sync_games(self, games, game_id_column, game_name_column, genres_column, release_date_column, url_column,
+                   batch_size):
+        """Makes the Games table match a dataframe without dropping it. The stored games are compared to the new ones by
+        game id and a hash of the row content, and only the games that were added, changed or removed are inserted,
+        updated or deleted in batches. Extra rows with a duplicated game id are deleted as well.
+        Args:
+            games :obj:`pandas DataFrame` Dataframe containing the Steam game information
+            game_id_column :obj:`String` column name where the game id is stored
+            game_name_column :obj:`String` column name where the game name is stored
+            genres_column :obj:`String` column name where the genre is stored
+            release_date_column :obj:`String` column name where the release date is stored
+            url_column :obj:`String` column name where the url is stored
+            batch_size :obj:`int` Number of games changed per transaction
+        Returns:
+            obj:`Dict[String, int]` Number of games inserted, updated and deleted
+        """
+        rows = _game_rows(games, game_id_column, game_name_column, genres_column, release_date_column, url_column)
+        rows = rows.drop_duplicates('game_id')
+        rows['row_hash'] = _row_hash(rows)
+
+        session = self.session
+        table = Games.__table__
+        stored = pd.DataFrame(session.execute(sqlalchemy.select([table.c.id] + [table.c[f] for f in GAME_FIELDS]))
+                              .fetchall(), columns=['id'] + GAME_FIELDS)
+        duplicated = stored.duplicated('game_id')
+        stale_ids = stored.loc[duplicated, 'id'].tolist()
+        stored = stored[~duplicated].copy()
+        stored['row_hash'] = _row_hash(stored)
+
+        merged = rows.merge(stored[['id', 'game_id', 'row_hash']], on='game_id', how='left', suffixes=('', '_stored'))
+        new = merged[merged['id'].isna()][GAME_FIELDS]
+        changed = merged[merged['id'].notna() & (merged['row_hash'] != merged['row_hash_stored'])]
+        removed = stored.loc[~stored['game_id'].isin(rows['game_id']), 'id'].tolist()
+        stale_ids += removed
+
+        start = time.perf_counter()
+        insert = table.insert()
+        update = table.update().where(table.c.id == bindparam('b_id')).values(
+            **{field: bindparam('b_' + field) for field in GAME_FIELDS})
+        changed = changed[['id'] + GAME_FIELDS].astype({'id': int})
+        changed.columns = ['b_' + column for column in changed.columns]
+
+        for batch_start in range(0, len(new), batch_size):
+            session.execute(insert, new.iloc[batch_start:batch_start + batch_size].to_dict('records'))
+            session.commit()
+        for batch_start in range(0, len(changed), batch_size):
+            session.execute(update, changed.iloc[batch_start:batch_start + batch_size].to_dict('records'))
+            session.commit()
+        for batch_start in range(0, len(stale_ids), batch_size):
+            session.execute(table.delete().where(table.c.id.in_(stale_ids[batch_start:batch_start + batch_size])))
+            session.commit()
+
+        counts = {'inserted': len(new), 'updated': len(changed), 'deleted': len(stale_ids)}
+        logger.info("Inserted %d, updated %d and deleted %d games in %.2f seconds", counts['inserted'],
+                    counts['updated'], counts['deleted'], time.perf_counter() - start)
+        return counts
+
+
+def _game_rows(games, game_id_column, game_name_column, genres_column, release_date_column, url_column):
+    """Selects the columns of the games dataframe that are stored and renames them to the Games fields"""
+    rows = games[[game_id_column, game_name_column, genres_column, release_date_column, url_column]]
+    rows.columns = GAME_FIELDS
+    return rows.astype({'game_id': int, 'title': str, 'genre': str, 'release_date': str, 'url': str})
+
+
+def _row_hash(rows):
+    """Hashes the content of every game so stored and new rows can be compared without comparing each field"""
+    return pd.util.hash_pandas_object(rows[GAME_FIELDS].astype(str), index=False).to_numpy()
@@ -1,32 +1,58 @@
+import ast
+import collections
+import concurrent.futures
 import gzip
+import itertools
 import json
 import logging
+import os
 import sys
 import requests
 
 import boto3
 import botocore.exceptions
 
+from src import profiling
+
 logger = logging.getLogger(__name__)
 
 
-def download(url, gzip_filepath, unzipped_filepath):
+def download(url, gzip_filepath, unzipped_filepath, chunk_size=1048576, n_jobs=1, batch_lines=10000):
     """
-    Downloads the data necessary for the app and saves it locally.
+    Downloads the data necessary for the app and saves it locally. The response is streamed to disk in chunks and
+    an interrupted download is resumed from where it stopped. The gzip file is then decompressed and parsed one record
+    at a time and saved in the JSON Lines format, so memory use does not depend on the size of the file.
     Args:
         url: obj:`String` webpage where the data is located
         gzip_filepath: obj:`String` filepath to where the downloaded data should be saved locally.
         unzipped_filepath: obj:`String` filepath to where the unzipped data will be saved.
+        chunk_size: obj:`int` number of bytes written to disk at one time
+        n_jobs: obj:`int` number of processes used to parse the gzip file
+        batch_lines: obj:`int` number of lines of the gzip file parsed by a process at one time
     Returns:
         None
     """
 
-    # Download the raw data from given url
+    # Download the raw data from given url, the partial file is only renamed once it is complete
+    partial_filepath = gzip_filepath + '.part'
     try:
-        logger.debug("Beginning download from %s", url)
-        r = requests.get(url)
-        with open(gzip_filepath, "wb") as f:
-            f.write(r.content)
+        offset = os.path.getsize(partial_filepath) if os.path.exists(partial_filepath) else 0
+        headers = {'Range': 'bytes=%d-' % offset} if offset else {}
+        logger.debug("Beginning download from %s at byte %d", url, offset)
+
+        with requests.get(url, headers=headers, stream=True) as r:
+            if r.status_code == 416:
+                logger.debug("%s was already fully downloaded", partial_filepath)
+            else:
+                r.raise_for_status()
+                if r.status_code != 206 and offset:
+                    logger.warning("Server does not support resuming downloads, restarting from the beginning")
+                    offset = 0
+                with open(partial_filepath, "ab" if offset else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+
+        os.replace(partial_filepath, gzip_filepath)
         logger.info("Data has been successfully downloaded and saved to %s", gzip_filepath)
 
     except requests.exceptions.ConnectTimeout as e:
@@ -45,24 +71,22 @@ def download(url, gzip_filepath, unzipped_filepath):
         logger.error(e)
         sys.exit(3)
 
-    # Unzip the downloaded file and save the unzipped file
+    # Unzip the downloaded file and save each record on its own line
     try:
-        dict_list = []
         logger.debug('Parsing gzip file with generator function')
-        for line in parse(gzip_filepath):
-            dict_list.append(line)
-        logger.debug("%s has %d rows", unzipped_filepath, len(dict_list))
+        rows = 0
+        with open(unzipped_filepath, 'w') as f:
+            for record in parse(gzip_filepath, n_jobs, batch_lines):
+                f.write(json.dumps(record))
+                f.write('\n')
+                rows += 1
+        logger.debug("%s has %d rows", unzipped_filepath, rows)
 
-        if len(dict_list) == 0:
+        if rows == 0:
             logger.warning("Parsed data contains 0 rows")
 
-        with open(unzipped_filepath, 'w') as f:
-            json.dump(dict_list, f)
         logger.info("Gzip file has been unzipped and saved to %s", unzipped_filepath)
 
-    except json.JSONDecodeError as e:
-        logger.error("%s, could not parse json file. Make sure the file is in the correct format", e)
-
     except Exception as e:
         logger.error(e)
         sys.exit(3)
@@ -83,7 +107,9 @@ def download_s3(unzipped_filepath, bucket_name, bucket_filepath):
     bucket = s3.Bucket(bucket_name)
 
     try:
-        bucket.download_file(bucket_filepath, unzipped_filepath)
+        with profiling.step('download_s3') as record:
+            bucket.download_file(bucket_filepath, unzipped_filepath)
+            record['items'] = os.path.getsize(unzipped_filepath)
         logger.info('Data downloaded from %s to %s', bucket_filepath, unzipped_filepath)
 
     except botocore.exceptions.NoCredentialsError as e:
@@ -103,11 +129,54 @@ def download_s3(unzipped_filepath, bucket_name, bucket_filepath):
         sys.exit(3)
 
 
-def parse(path):
-    """Generator function that yields one unzipped line of the gzip file"""
-    gzip_file = gzip.open(path, 'r')
-    for line in gzip_file:
-        yield eval(line)
+def s3_etag(bucket_name, bucket_filepath):
+    """
+    Returns the ETag of a file on a S3 bucket, which changes whenever the content of the file changes.
+    Args:
+        bucket_name: obj:`String` name of the S3 bucket located on AWS
+        bucket_filepath: obj:`String` where the data is located on the S3 bucket
+
+    Returns:
+        etag: obj:`String` ETag of the file, or None if it could not be retrieved
+    """
+    try:
+        return boto3.client("s3").head_object(Bucket=bucket_name, Key=bucket_filepath)['ETag']
+
+    except Exception as e:
+        logger.warning("%s, could not retrieve the version of %s on S3", e, bucket_filepath)
+        return None
+
+
+def parse(path, n_jobs=1, batch_lines=10000):
+    """Generator function that yields the records of the gzip file in their original order. The lines are read in
+    batches that are parsed with `ast.literal_eval`, which only accepts Python literals. With more than one job the
+    batches are parsed by a pool of processes while the next ones are read.
+    Args:
+        path: obj:`String` filepath to the gzip file where each line is a Python dictionary
+        n_jobs: obj:`int` number of processes used for parsing
+        batch_lines: obj:`int` number of lines parsed by a process at one time
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as gzip_file:
+        batches = iter(lambda: list(itertools.islice(gzip_file, batch_lines)), [])
+        if n_jobs <= 1:
+            for batch in batches:
+                yield from _parse_batch(batch)
+            return
+
+        with concurrent.futures.ProcessPoolExecutor(n_jobs) as executor:
+            # Only a few batches are in flight at one time so the file is never fully held in memory
+            pending = collections.deque()
+            for batch in batches:
+                pending.append(executor.submit(_parse_batch, batch))
+                if len(pending) >= 2 * n_jobs:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+
+def _parse_batch(lines):
+    """Parses a batch of lines that each contain a Python dictionary"""
+    return [ast.literal_eval(line) for line in lines if line.strip()]
 
 
 def upload(unzipped_filepath, bucket_name, bucket_filepath):
@@ -128,7 +197,8 @@ def upload(unzipped_filepath, bucket_name, bucket_filepath):
         logger.debug("Beginning data upload to %s", bucket_name)
         s3 = boto3.resource("s3")
         bucket = s3.Bucket(bucket_name)
-        bucket.upload_file(unzipped_filepath, bucket_filepath)
+        with profiling.step('upload', os.path.getsize(unzipped_filepath)):
+            bucket.upload_file(unzipped_filepath, bucket_filepath)
         logger.info("Data has been successfully uploaded to S3 and can be found at %s", bucket_filepath)
 
     except boto3.exceptions.S3UploadFailedError:
@@ -0,0 +1,163 @@
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Approximate peak bytes used by each step, estimated from the benchmarks and rounded up. Building the interaction
+# matrix in memory holds the long dataframe, its integer codes and the COO and CSR copies of the matrix at the same
+# time. Streaming only holds the final matrix while it is converted and reordered, plus the current chunk and its codes
+BYTES_PER_INTERACTION_IN_MEMORY = 72
+BYTES_PER_INTERACTION_STREAMED = 44
+BYTES_PER_CHUNK_ROW = 60
+MIN_CHUNK_SIZE = 10000
+# The model holds the CSR and COO copies of the interactions. The evaluation also holds the train and test splits
+BYTES_PER_INTERACTION_MODEL = 28
+BYTES_PER_INTERACTION_EVALUATION = 64
+# Embedding, bias and two adagrad accumulators per component of every user and game
+BYTES_PER_MODEL_PARAMETER = 12
+# A block of similarities is a float32 array, its negation and the int64 positions found by argpartition
+BYTES_PER_BLOCK_SIMILARITY = 16
+# The dense similarity matrix and the dataframe created from it
+BYTES_PER_DENSE_SIMILARITY = 16
+# Share of the available memory used when the budget is 'auto', the rest is left to the system and other processes
+AUTO_BUDGET_SHARE = 0.8
+
+UNITS = {'': 1, 'B': 1, 'KB': 2 ** 10, 'MB': 2 ** 20, 'GB': 2 ** 30, 'TB': 2 ** 40}
+
+
+def parse_memory_budget(memory_budget):
+    """Converts the memory_budget setting to a number of bytes
+    Args:
+        memory_budget: obj:`String` A size such as '8GB' or '512MB', a number of bytes, 'auto' for a share of the
+            memory available now, or None when no budget is set
+    Returns:
+        obj:`int` Budget in bytes, or None when no budget is set
+    """
+    if memory_budget is None:
+        return None
+    if isinstance(memory_budget, (int, float)):
+        return int(memory_budget)
+    if str(memory_budget).lower() == 'auto':
+        available = available_memory()
+        if available is None:
+            logger.warning("Could not find the available memory, the memory budget is ignored")
+            return None
+        return int(available * AUTO_BUDGET_SHARE)
+
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?B?)\s*', str(memory_budget).upper())
+    if match is None:
+        raise ValueError("Memory budget %s is not a size such as '8GB', a number of bytes or 'auto'" % memory_budget)
+    return int(float(match.group(1)) * UNITS[match.group(2) if match.group(2) in UNITS else match.group(2) + 'B'])
+
+
+def available_memory():
+    """Returns the memory that can be used without swapping, in bytes, or None if it can not be found"""
+    try:
+        with open('/proc/meminfo') as f:
+            return int(re.search(r'MemAvailable:\s+(\d+) kB', f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def format_bytes(num_bytes):
+    """Formats a number of bytes for the logs"""
+    if num_bytes >= 2 ** 30:
+        return '%.1f GB' % (num_bytes / 2 ** 30)
+    if num_bytes >= 2 ** 20:
+        return '%.0f MB' % (num_bytes / 2 ** 20)
+    return '%.0f KB' % (num_bytes / 2 ** 10)
+
+
+def plan_interactions(nnz, budget):
+    """Chooses how to build the interaction matrix within a memory budget. The matrix is built in memory when it
+    fits, otherwise it is streamed in the largest chunks that fit next to the final matrix.
+    Args:
+        nnz: obj:`int` Number of user/game pairs
+        budget: obj:`int` Memory budget in bytes
+    Returns:
+        stream: obj:`Boolean` Whether the matrix should be streamed from disk
+        chunk_size: obj:`int` Number of rows read at one time when streaming
+    """
+    in_memory = nnz * BYTES_PER_INTERACTION_IN_MEMORY
+    if in_memory <= budget:
+        logger.info("Memory plan: building the matrix of %d interactions in memory needs about %s of the %s budget",
+                    nnz, format_bytes(in_memory), format_bytes(budget))
+        return False, max(nnz, MIN_CHUNK_SIZE)
+
+    streamed = nnz * BYTES_PER_INTERACTION_STREAMED
+    chunk_size = int(min(max((budget - streamed) // BYTES_PER_CHUNK_ROW, MIN_CHUNK_SIZE), max(nnz, MIN_CHUNK_SIZE)))
+    needed = streamed + chunk_size * BYTES_PER_CHUNK_ROW
+    logger.info("Memory plan: building the matrix of %d interactions in memory needs about %s, more than the %s "
+                "budget, streaming in chunks of %d rows instead which needs about %s", nnz, format_bytes(in_memory),
+                format_bytes(budget), chunk_size, format_bytes(needed))
+    if needed > budget:
+        logger.warning("The interaction matrix needs about %s even when streamed, which is more than the %s memory "
+                       "budget", format_bytes(needed), format_bytes(budget))
+    return True, chunk_size
+
+
+def plan_block_size(num_items, n_components, budget, max_block_size):
+    """Chooses the number of games whose similarities are computed at one time within a memory budget
+    Args:
+        num_items: obj:`int` Number of games
+        n_components: obj:`int` Size of the embeddings
+        budget: obj:`int` Memory budget in bytes
+        max_block_size: obj:`int` Largest block to use, larger blocks are not faster
+    Returns:
+        obj:`int` Number of games in each block
+    """
+    embeddings = num_items * n_components * 4 * 2
+    block_size = int(min(max((budget - embeddings) // max(num_items * BYTES_PER_BLOCK_SIMILARITY, 1), 1),
+                         max_block_size, max(num_items, 1)))
+    logger.info("Memory plan: finding neighbors for %d games in blocks of %d games needs about %s of the %s budget",
+                num_items, block_size, format_bytes(embeddings + block_size * num_items * BYTES_PER_BLOCK_SIMILARITY),
+                format_bytes(budget))
+    if block_size == 1 and embeddings + num_items * BYTES_PER_BLOCK_SIMILARITY > budget:
+        logger.warning("The embeddings of %d games do not fit in the %s memory budget", num_items,
+                       format_bytes(budget))
+    return block_size
+
+
+def check_dense_similarity(num_items, budget):
+    """Logs the memory needed by the dense similarity matrix and warns when it is over the memory budget
+    Args:
+        num_items: obj:`int` Number of games
+        budget: obj:`int` Memory budget in bytes
+    Returns:
+        obj:`Boolean` True if the matrix fits in the budget
+    """
+    needed = num_items ** 2 * BYTES_PER_DENSE_SIMILARITY
+    logger.info("Memory plan: the dense similarity matrix of %d games needs about %s of the %s budget", num_items,
+                format_bytes(needed), format_bytes(budget))
+    if needed > budget:
+        logger.warning("The dense similarity matrix needs about %s, more than the %s memory budget. Set "
+                       "model.similarity.method to top_k to keep only the nearest games", format_bytes(needed),
+                       format_bytes(budget))
+    return needed <= budget
+
+
+def check_model_memory(num_users, num_items, nnz, n_components, budget, evaluation=False):
+    """Logs the memory needed to train the model and warns when it is over the memory budget
+    Args:
+        num_users: obj:`int` Number of users
+        num_items: obj:`int` Number of games
+        nnz: obj:`int` Number of user/game pairs
+        n_components: obj:`int` Size of the embeddings
+        budget: obj:`int` Memory budget in bytes
+        evaluation: obj:`Boolean` Whether the interactions are also split into a training and test set
+    Returns:
+        obj:`Boolean` True if the model fits in the budget
+    """
+    per_interaction = BYTES_PER_INTERACTION_EVALUATION if evaluation else BYTES_PER_INTERACTION_MODEL
+    needed = nnz * per_interaction + (num_users + num_items) * (n_components + 1) * BYTES_PER_MODEL_PARAMETER
+    logger.info("Memory plan: %s the model on %d interactions needs about %s of the %s budget",
+                'evaluating' if evaluation else 'training', nnz, format_bytes(needed), format_bytes(budget))
+    if needed > budget:
+        logger.warning("The model needs about %s, more than the %s memory budget. Reduce n_components or use a "
+                       "machine with more memory", format_bytes(needed), format_bytes(budget))
+    return needed <= budget
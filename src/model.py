@@ -1,5 +1,4 @@
 import logging
-import sys
 
 import numpy
 import numpy as np
@@ -9,6 +8,9 @@ from scipy import sparse
 from sklearn.metrics.pairwise import cosine_similarity
 from lightfm import LightFM
 
+from src import profiling
+from src.model_store import model_arrays
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,7 +31,8 @@ def run_model(interactions, n_components, loss, epoch, n_jobs, random_state):
                  loss, random_state)
     model = LightFM(no_components=n_components, loss=loss, random_state=random_state)
     logger.debug("Fitting model with epochs: %d and number of threads: %d", epoch, n_jobs)
-    model.fit(interactions, epochs=epoch, num_threads=n_jobs)
+    with profiling.step('run_model.fit', interactions.nnz * epoch):
+        model.fit(interactions, epochs=epoch, num_threads=n_jobs)
 
     return model
 
@@ -47,9 +50,10 @@ def cosine_similarity_matrix(item_embeddings, item_names):
         logger.error("%s is not a numpy array object", item_embeddings)
         raise TypeError("Provided argument `item_embeddings` is not a numpy array object")
 
-    df_item_norm_sparse = sparse.csr_matrix(item_embeddings)
-    similarities = cosine_similarity(df_item_norm_sparse)
-    similarity_matrix = pd.DataFrame(similarities)
+    with profiling.step('cosine_similarity_matrix', len(item_embeddings)):
+        df_item_norm_sparse = sparse.csr_matrix(item_embeddings)
+        similarities = cosine_similarity(df_item_norm_sparse)
+        similarity_matrix = pd.DataFrame(similarities)
 
     # Name columns and rows with game ids to match up with game info dataframe after querying
     similarity_matrix.columns = item_names
@@ -61,50 +65,262 @@ def cosine_similarity_matrix(item_embeddings, item_names):
     return similarity_matrix
 
 
-def evaluate_model(interactions, train_size, n_components, loss, epoch, n_jobs, random_state, splits):
+def top_k_neighbors(item_embeddings, k, block_size):
+    """
+    Finds the `k` most similar games for every game present in the user_games dataframe. The embeddings are
+    normalized once and the cosine similarities are computed one block of rows at a time, keeping only the top `k`
+    neighbors of each row, so memory scales with the number of games times `k` instead of the full similarity matrix.
+    A game is never returned as its own neighbor.
+    Args:
+        item_embeddings :obj:`Numpy Array` Item embeddings created by the model to calculate cosine similarity
+        k :obj:`int` Number of neighbors to keep for every game
+        block_size :obj:`int` Number of games whose similarities are computed at one time
+    Returns:
+        neighbors :obj:`Numpy Array` Row positions of the neighbors of each game, ordered by decreasing similarity
+        scores :obj:`Numpy Array` Cosine similarity between each game and its neighbors
+    """
+    if not isinstance(item_embeddings, numpy.ndarray):
+        logger.error("%s is not a numpy array object", item_embeddings)
+        raise TypeError("Provided argument `item_embeddings` is not a numpy array object")
+
+    norms = np.linalg.norm(item_embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    normalized = (item_embeddings / norms).astype(np.float32)
+
+    num_items = len(normalized)
+    k = max(min(k, num_items - 1), 0)
+    neighbors = np.empty((num_items, k), dtype=np.int32)
+    scores = np.empty((num_items, k), dtype=np.float32)
+    if k == 0:
+        logger.warning("Not enough games to find neighbors for")
+        return neighbors, scores
+
+    logger.debug("Finding %d neighbors for %d games in blocks of %d", k, num_items, block_size)
+    with profiling.step('top_k_neighbors', num_items):
+        for start in range(0, num_items, block_size):
+            block = normalized[start:start + block_size] @ normalized.T
+            rows = np.arange(len(block))
+            block[rows, start + rows] = -np.inf
+
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            neighbors[start:start + block_size] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + block_size] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbors, scores
+
+
+def split_interactions(interactions, train_size, random_state):
     """
-    Splits the data into a training and test set. Then trains the LightFM interaction model on the training set
-     and evaluates the AUC on a test set.
+    Randomly holds out interactions of every user to create a training and test set with the same shape as the
+    interaction matrix. Each user keeps about `train_size` of their interactions in the training set. A user with at
+    least two interactions always has one in each set, and a user with a single interaction keeps it for training. The
+    interactions of every row are ranked by a random key in one vectorized pass, so the split never leaves sparse form.
     Args:
         interactions: obj:`scipy.sparse.scr_matrix` Sparse matrix containing the interactions between users and games
-        train_size: obj:`float` Percentage of rows to be in the training set
+        train_size: obj:`float` Percentage of interactions of every user to be in the training set
+        random_state: obj:`int` Random state to seed the split
+    Returns:
+        train: obj:`scipy.sparse.csr_matrix` Training set
+        test: obj:`scipy.sparse.csr_matrix` Held out interactions
+    """
+    interactions = interactions.tocsr()
+    counts = np.diff(interactions.indptr)
+    rows = np.repeat(np.arange(interactions.shape[0]), counts)
+
+    # Position of every interaction within its row once the row is shuffled
+    order = np.lexsort((np.random.RandomState(random_state).rand(interactions.nnz), rows))
+    position = np.empty(interactions.nnz, dtype=np.int64)
+    position[order] = np.arange(interactions.nnz) - interactions.indptr[rows[order]]
+
+    test_counts = np.clip(np.rint(counts * (1 - train_size)).astype(np.int64), 1, np.maximum(counts - 1, 1))
+    test_counts[counts < 2] = 0
+    is_test = position < test_counts[rows]
+
+    def subset(mask):
+        matrix = sparse.csr_matrix((interactions.data[mask], (rows[mask], interactions.indices[mask])),
+                                   shape=interactions.shape, dtype=interactions.dtype)
+        matrix.sort_indices()
+        return matrix
+
+    return subset(~is_test), subset(is_test)
+
+
+def _sample_users(interactions, num_users, random_state):
+    """Keeps the interactions of a random sample of `num_users` users that have any, to evaluate faster"""
+    users = np.flatnonzero(np.diff(interactions.indptr))
+    if num_users is None or len(users) <= num_users:
+        return interactions
+    keep = np.zeros(interactions.shape[0], dtype=interactions.dtype)
+    keep[np.random.RandomState(random_state).choice(users, num_users, replace=False)] = 1
+    sample = sparse.diags(keep) @ interactions
+    sample.eliminate_zeros()
+    return sample.tocsr()
+
+
+def fit_early_stopping(train, validation, n_components, loss, epoch, n_jobs, random_state, eval_every=2, patience=3,
+                       min_delta=0.001, validation_users=None):
+    """
+    Trains the LightFM interaction model with `fit_partial`, computing the AUC on the validation set every
+    `eval_every` epochs. Training stops once the AUC has not improved by more than `min_delta` for `patience`
+    evaluations in a row, and the model is returned as it was at the best evaluation.
+    Args:
+        train: obj:`scipy.sparse.scr_matrix` Sparse matrix containing the interactions the model is trained on
+        validation: obj:`scipy.sparse.scr_matrix` Held out interactions with the same shape as `train`
         n_components: obj:`int` number of desired embeddings to create to define item and user
         loss: obj:`string` loss function for LightFM model. Options include warp, logistic, and brp
-        epoch: obj:`int`  number of epochs to run
+        epoch: obj:`int` maximum number of epochs to run
         n_jobs: obj:`int` number of cores used for execution
-        random_state: obj:`int` Random state to seed the model
-        splits: obj:`int` What proportion of the data to consider due to memory constraints
+        random_state: obj:`int` Random state to seed the model and the sample of validation users
+        eval_every: obj:`int` number of epochs run between two evaluations
+        patience: obj:`int` number of evaluations without improvement before training stops
+        min_delta: obj:`float` smallest increase of the AUC counted as an improvement
+        validation_users: obj:`int` number of users sampled to compute the AUC, or None to use every user
     Returns:
-        test_auc: obj:`float`  AUC score achieved by the LightFM model on the test set
+        model: obj:`LightFM.model` Model at the epoch with the best validation AUC
+        best_epoch: obj:`int` Number of epochs the returned model was trained for
+        history: obj:`List[Tuple[int, float]]` Validation AUC after each evaluated epoch
     """
+    validation = _sample_users(validation, validation_users, random_state)
+    model = LightFM(no_components=n_components, loss=loss, random_state=random_state)
+    best_auc, best_epoch, best_state, history = -np.inf, 0, None, []
+    evaluations_without_improvement = 0
 
-    interactions_size = round(interactions.shape[0] / splits)
-    interactions = interactions.tocsr()[:interactions_size, :]
+    for done in range(0, epoch, eval_every):
+        epochs = min(eval_every, epoch - done)
+        with profiling.step('run_model.fit_partial', train.nnz * epochs):
+            model.fit_partial(train, epochs=epochs, num_threads=n_jobs)
+        with profiling.step('fit_early_stopping.validate', validation.nnz):
+            validation_auc = auc_score(model, validation, train_interactions=train, num_threads=n_jobs).mean()
+        history.append((done + epochs, float(validation_auc)))
+        logger.debug("Validation AUC after %d epochs: %.4f", done + epochs, validation_auc)
 
-    try:
-        # Create dense matrix in order to fulfil requirements by LightFM's AUC evaluation
-        arr_interactions = interactions.todense()
+        if validation_auc > best_auc + min_delta:
+            best_auc, best_epoch, best_state = validation_auc, done + epochs, model_arrays(model)
+            evaluations_without_improvement = 0
+        else:
+            evaluations_without_improvement += 1
+            if evaluations_without_improvement >= patience:
+                logger.info("Validation AUC has not improved for %d evaluations, stopping after %d epochs",
+                            patience, done + epochs)
+                break
 
-    except MemoryError:
-        logger.error("Too many interactions are being used for modeling, increase the number of splits")
-        sys.exit(3)
+    if best_state is not None:
+        for name, value in best_state.items():
+            setattr(model, name, value)
+    logger.info("Best validation AUC of %.4f after %d epochs", best_auc, best_epoch)
+    return model, best_epoch, history
 
-    except Exception as e:
-        logger.error(e)
-        sys.exit(3)
 
-    train_cut = round(arr_interactions.shape[0] * train_size)
-    logger.debug("Creating training set")
-    train = sparse.csr_matrix(arr_interactions[:train_cut, :])
+def evaluate_model(interactions, train_size, n_components, loss, epoch, n_jobs, random_state, early_stopping=None):
+    """
+    Randomly holds out interactions of every user to create a training and test set with the same shape as the
+    interaction matrix. Then trains the LightFM interaction model on the training set and evaluates the AUC on the test
+    set. The split never leaves sparse form, so every user can be evaluated at once. With early stopping, part of the
+    training set is also held out as a validation set to choose the number of epochs, see `fit_early_stopping`.
+    Args:
+        interactions: obj:`scipy.sparse.scr_matrix` Sparse matrix containing the interactions between users and games
+        train_size: obj:`float` Percentage of interactions to be in the training set
+        n_components: obj:`int` number of desired embeddings to create to define item and user
+        loss: obj:`string` loss function for LightFM model. Options include warp, logistic, and brp
+        epoch: obj:`int`  number of epochs to run, or the maximum number of epochs with early stopping
+        n_jobs: obj:`int` number of cores used for execution
+        random_state: obj:`int` Random state to seed the model and the split
+        early_stopping: obj:`Dict` Settings of the early stopping. `enabled` turns it on, `validation_size` is the
+            percentage of the training set held out for validation and the other keys are passed to
+            `fit_early_stopping`. None trains for `epoch` epochs
+    Returns:
+        test_auc: obj:`float`  AUC score achieved by the LightFM model on the test set
+        epochs: obj:`int` Number of epochs the evaluated model was trained for
+    """
+    if not sparse.issparse(interactions):
+        logger.error("%s is not a scipy sparse matrix", interactions)
+        raise TypeError("Provided argument `interactions` is not a scipy sparse matrix")
 
-    # Have to make tests set the same size of the train set. Documentation says to add empty rows to top of tests set
-    empty_users = np.zeros([(train_cut - (arr_interactions.shape[0] - train_cut)), arr_interactions.shape[1]])
-    logger.debug("Creating tests set")
-    test = np.vstack((arr_interactions[train_cut:, :], empty_users))
-    test = sparse.csr_matrix(test)
+    logger.debug("Splitting %d interactions into training and tests sets", interactions.nnz)
+    with profiling.step('evaluate_model.split', interactions.nnz):
+        train, test = split_interactions(interactions, train_size, random_state)
 
-    model = run_model(train, n_components, loss, epoch, n_jobs, random_state)
+    if early_stopping and early_stopping.get('enabled'):
+        settings = {key: value for key, value in early_stopping.items() if key not in ('enabled', 'validation_size')}
+        with profiling.step('evaluate_model.split', train.nnz):
+            fit, validation = split_interactions(train, 1 - early_stopping['validation_size'], random_state)
+        model, epochs, _ = fit_early_stopping(fit, validation, n_components, loss, epoch, n_jobs, random_state,
+                                              **settings)
+    else:
+        model, epochs = run_model(train, n_components, loss, epoch, n_jobs, random_state), epoch
     logger.debug("Calculating AUC for tests set")
 
-    test_auc = auc_score(model, test).mean()
-    return test_auc
+    # Known training interactions are excluded so they are not scored as negatives
+    with profiling.step('evaluate_model.auc', test.nnz):
+        test_auc = auc_score(model, test, train_interactions=train, num_threads=n_jobs).mean()
+    return test_auc, epochs
+
+
+def _reindex(matrix, old_user_ids, old_item_ids, user_ids, item_ids):
+    """Moves the interactions of `matrix` to the rows and columns of `user_ids` and `item_ids`, dropping the users and
+    games that are not in them"""
+    matrix = matrix.tocoo()
+    rows = pd.Index(user_ids).get_indexer(np.asarray(old_user_ids))[matrix.row]
+    cols = pd.Index(item_ids).get_indexer(np.asarray(old_item_ids))[matrix.col]
+    keep = (rows >= 0) & (cols >= 0)
+    return sparse.csr_matrix((matrix.data[keep], (rows[keep], cols[keep])), shape=(len(user_ids), len(item_ids)))
+
+
+def _expand_parameters(model, side, old_ids, ids):
+    """Reorders the parameters of the users or games of `model` to follow `ids`, initializing the ones that are new
+    the same way LightFM initializes a model. Returns the number of new ids"""
+    position = pd.Index(np.asarray(old_ids)).get_indexer(np.asarray(ids))
+    known = position >= 0
+    for name in ('embeddings', 'embedding_gradients', 'embedding_momentum', 'biases', 'bias_gradients',
+                 'bias_momentum'):
+        old = getattr(model, side + '_' + name)
+        value = np.zeros((len(ids),) + old.shape[1:], dtype=old.dtype)
+        value[known] = old[position[known]]
+        if name == 'embeddings':
+            value[~known] = (model.random_state.rand(int((~known).sum()), model.no_components) - 0.5) / \
+                model.no_components
+        elif name.endswith('gradients') and model.learning_schedule == 'adagrad':
+            value[~known] = 1
+        setattr(model, side + '_' + name, value)
+    return int((~known).sum())
+
+
+def update_model(model, model_user_ids, model_item_ids, previous, interactions, user_ids, item_ids, epoch, n_jobs):
+    """
+    Warm-starts a trained LightFM model on a newer interaction matrix. The model is expanded with the users and games
+    it has not seen, which are initialized like a new model, and trained for `epoch` more epochs with `fit_partial` on
+    the interactions that were not in the matrix it was trained on. Users and games that are no longer in the
+    interactions are dropped from the model.
+    Args:
+        model: obj:`LightFM.model` Trained model, see `src.model_store.load_model`
+        model_user_ids: obj:`Numpy Array` User ids in the order of the rows of the user embeddings of the model
+        model_item_ids: obj:`Numpy Array` Game ids in the order of the rows of the item embeddings of the model
+        previous: obj:`scipy.sparse.csr_matrix` Interactions the model was trained on
+        interactions: obj:`scipy.sparse.csr_matrix` Sparse matrix containing the interactions between users and games
+        user_ids: obj:`Numpy Array` User ids in the order of the rows of `interactions`
+        item_ids: obj:`List[int]` Game ids in the order of the columns of `interactions`
+        epoch: obj:`int` number of epochs to run on the new interactions
+        n_jobs: obj:`int` number of cores used for execution
+    Returns:
+        model: obj:`LightFM.model` Updated model whose rows follow `user_ids` and `item_ids`
+        new_interactions: obj:`int` Number of interactions the model was trained on
+    """
+    if not sparse.issparse(interactions):
+        logger.error("%s is not a scipy sparse matrix", interactions)
+        raise TypeError("Provided argument `interactions` is not a scipy sparse matrix")
+
+    new_users = _expand_parameters(model, 'user', model_user_ids, user_ids)
+    new_items = _expand_parameters(model, 'item', model_item_ids, item_ids)
+
+    new = (interactions.tocsr() - _reindex(previous, model_user_ids, model_item_ids, user_ids, item_ids)).tocsr()
+    new.data[new.data < 0] = 0
+    new.eliminate_zeros()
+    logger.info("Updating model with %d new users, %d new games and %d new interactions", new_users, new_items,
+                new.nnz)
+
+    if new.nnz > 0:
+        with profiling.step('update_model.fit_partial', new.nnz * epoch):
+            model.fit_partial(new, epochs=epoch, num_threads=n_jobs)
+    return model, new.nnz
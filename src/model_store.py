@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+
+import numpy as np
+from lightfm import LightFM
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# A saved model is a directory holding every parameter array of the LightFM model as a .npy file, including the
+# gradient accumulators needed to continue training with `fit_partial`, the constructor parameters as json, the user
+# and game ids of its rows and the interactions it was trained on, so later runs can find the new interactions
+PARAMS_FILE = 'params.json'
+USER_IDS_FILE = 'user_ids.npy'
+ITEM_IDS_FILE = 'item_ids.npy'
+INTERACTIONS_FILE = 'interactions.npz'
+MODEL_ARRAYS = ['item_embeddings', 'item_embedding_gradients', 'item_embedding_momentum', 'item_biases',
+                'item_bias_gradients', 'item_bias_momentum', 'user_embeddings', 'user_embedding_gradients',
+                'user_embedding_momentum', 'user_biases', 'user_bias_gradients', 'user_bias_momentum']
+
+
+def model_arrays(model):
+    """Copies the parameter arrays of a fitted model
+    Args:
+        model: obj:`LightFM.model` Fitted model
+    Returns:
+        obj:`Dict[String, Numpy Array]` Copy of every array in `MODEL_ARRAYS`, keyed by attribute name
+    """
+    return {name: getattr(model, name).copy() for name in MODEL_ARRAYS}
+
+
+def save_model(model, directory, user_ids, item_ids, interactions):
+    """
+    Saves a fitted model so it can be loaded by `load_model` and trained further
+    Args:
+        model: obj:`LightFM.model` Fitted model
+        directory: obj:`String` Directory the model is saved to, created if it does not exist
+        user_ids: obj:`Numpy Array` Steam user ids, or user numbers, in the order of the rows of the user embeddings
+        item_ids: obj:`List[int]` Game ids in the order of the rows of the item embeddings
+        interactions: obj:`scipy.sparse.csr_matrix` Interactions the model was trained on
+    Returns:
+        None
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in MODEL_ARRAYS:
+        np.save(os.path.join(directory, name + '.npy'), getattr(model, name))
+    np.save(os.path.join(directory, USER_IDS_FILE), np.asarray(user_ids))
+    np.save(os.path.join(directory, ITEM_IDS_FILE), np.asarray(item_ids, dtype=np.int64))
+    sparse.save_npz(os.path.join(directory, INTERACTIONS_FILE), interactions.tocsr())
+
+    # The parameters file is written last, so a directory without it never holds a partly saved model
+    params = {key: value for key, value in model.get_params().items() if key != 'random_state'}
+    with open(os.path.join(directory, PARAMS_FILE), 'w') as f:
+        json.dump(params, f, indent=2)
+    logger.info("Saved model with %d users and %d games to %s", len(user_ids), len(item_ids), directory)
+
+
+def load_model(directory, random_state=None):
+    """
+    Loads a model saved by `save_model`
+    Args:
+        directory: obj:`String` Directory the model was saved to
+        random_state: obj:`int` Random state to seed further training of the model
+    Returns:
+        model: obj:`LightFM.model` Model with the saved parameters
+        user_ids: obj:`Numpy Array` Steam user ids, or user numbers, in the order of the rows of the user embeddings
+        item_ids: obj:`Numpy Array` Game ids in the order of the rows of the item embeddings
+        interactions: obj:`scipy.sparse.csr_matrix` Interactions the model was trained on
+    Raises:
+        FileNotFoundError: If no model was saved to `directory`
+    """
+    with open(os.path.join(directory, PARAMS_FILE)) as f:
+        model = LightFM(random_state=random_state, **json.load(f))
+    for name in MODEL_ARRAYS:
+        setattr(model, name, np.load(os.path.join(directory, name + '.npy')))
+    user_ids = np.load(os.path.join(directory, USER_IDS_FILE))
+    item_ids = np.load(os.path.join(directory, ITEM_IDS_FILE))
+    interactions = sparse.load_npz(os.path.join(directory, INTERACTIONS_FILE)).tocsr()
+    logger.debug("Loaded model with %d users and %d games from %s", len(user_ids), len(item_ids), directory)
+    return model, user_ids, item_ids, interactions
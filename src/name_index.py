@@ -0,0 +1,61 @@
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_title(title):
+    """Lower cases a game title and collapses whitespace so lookups ignore case and spacing"""
+    return ' '.join(str(title).casefold().split())
+
+
+class GameNameIndex:
+    """Exact and prefix lookup of game titles that is built once when the app is loaded"""
+
+    def __init__(self, titles, game_ids):
+        """
+        Args:
+            titles: obj:`List[String]` Title of every game
+            game_ids: obj:`List[int]` ID given to each game by Steam, in the same order as `titles`
+        """
+        self.exact = {}
+        entries = []
+        for title, game_id in zip(titles, game_ids):
+            key = normalize_title(title)
+            if not key or key in self.exact:
+                continue
+            self.exact[key] = int(game_id)
+            entries.append((key, str(title), int(game_id)))
+
+        entries.sort()
+        self.keys = [entry[0] for entry in entries]
+        self.entries = [(title, game_id) for _, title, game_id in entries]
+        logger.debug("Game name index contains %d titles", len(self.keys))
+
+    def lookup(self, title):
+        """Returns the id of the game with the given title, ignoring case and spacing
+        Args:
+            title: obj:`String` Title of the game
+        Returns:
+            obj:`int` ID given to the game by Steam
+        """
+        return self.exact[normalize_title(title)]
+
+    def complete(self, prefix, limit):
+        """Returns the games whose title starts with `prefix` in alphabetical order
+        Args:
+            prefix: obj:`String` Start of the title typed by the user
+            limit: obj:`int` Maximum number of games to return
+        Returns:
+            obj:`List[Tuple[String, int]]` Title and id of the matching games
+        """
+        key = normalize_title(prefix)
+        if not key:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        matches = []
+        for position in range(start, min(start + limit, len(self.keys))):
+            if not self.keys[position].startswith(key):
+                break
+            matches.append(self.entries[position])
+        return matches
@@ -0,0 +1,113 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# The neighbors file is a fixed size header followed by three raw little-endian arrays: the sorted game ids (int32),
+# the neighbor game ids of every game (int32, num_games x num_neighbors) and their cosine similarities (float32)
+MAGIC = b'NBRIDX01'
+HEADER = np.dtype([('magic', 'S8'), ('num_games', '<i8'), ('num_neighbors', '<i8')])
+
+
+def write_neighbors(filepath, item_names, neighbors, scores):
+    """
+    Saves the top k neighbors of every game to a binary file that can be memory-mapped by `NeighborIndex.load`. Rows
+    are sorted by game id so the file can be searched without building a lookup table.
+    Args:
+        filepath :obj:`String` Filepath to where the neighbors are saved to
+        item_names :obj:`List[int]` List of game ids used in the LightFM model, in the order of the embeddings
+        neighbors :obj:`Numpy Array` Row positions of the neighbors of each game, created by `top_k_neighbors`
+        scores :obj:`Numpy Array` Cosine similarity between each game and its neighbors
+    Returns:
+        None
+    """
+    ids = np.asarray(item_names, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    header = np.array([(MAGIC, len(ids), neighbors.shape[1])], dtype=HEADER)
+
+    with open(filepath, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(ids[order].astype('<i4').tobytes())
+        f.write(ids[neighbors[order]].astype('<i4').tobytes())
+        f.write(scores[order].astype('<f4').tobytes())
+    logger.info("Saved %d neighbors for %d games to %s", neighbors.shape[1], len(ids), filepath)
+
+
+class NeighborIndex:
+    """Lookup of the most similar games for every game that is built once when the app is loaded"""
+
+    def __init__(self, ids, neighbor_ids, scores=None):
+        """
+        Args:
+            ids: obj:`Numpy Array` Game ids sorted in increasing order
+            neighbor_ids: obj:`Numpy Array` Game ids of the neighbors of each game, ordered by decreasing similarity
+            scores: obj:`Numpy Array` Cosine similarity between each game and its neighbors
+        """
+        self.ids = ids
+        self.neighbor_ids = neighbor_ids
+        self.scores = scores
+        logger.debug("Neighbor index contains %d games with %d neighbors each", *neighbor_ids.shape)
+
+    @classmethod
+    def load(cls, filepath):
+        """Memory-maps the file written by `write_neighbors`, so the pages are shared between all processes reading it
+        Args:
+            filepath: obj:`String` Filepath to where the neighbors are saved
+        Returns:
+            obj:`NeighborIndex`
+        """
+        header = np.fromfile(filepath, dtype=HEADER, count=1)
+        if len(header) == 0 or header[0]['magic'] != MAGIC:
+            logger.error("%s is not a neighbors file", filepath)
+            raise ValueError("Provided file `%s` is not a neighbors file" % filepath)
+
+        num_games, num_neighbors = int(header[0]['num_games']), int(header[0]['num_neighbors'])
+        if num_games == 0 or num_neighbors == 0:
+            logger.warning("Neighbors file %s is empty", filepath)
+            return cls(np.empty(num_games, dtype='<i4'), np.empty((num_games, 0), dtype='<i4'),
+                       np.empty((num_games, 0), dtype='<f4'))
+
+        offset = HEADER.itemsize
+        ids = np.memmap(filepath, dtype='<i4', mode='r', offset=offset, shape=(num_games,))
+        offset += ids.nbytes
+        neighbor_ids = np.memmap(filepath, dtype='<i4', mode='r', offset=offset, shape=(num_games, num_neighbors))
+        offset += neighbor_ids.nbytes
+        scores = np.memmap(filepath, dtype='<f4', mode='r', offset=offset, shape=(num_games, num_neighbors))
+        return cls(ids, neighbor_ids, scores)
+
+    @classmethod
+    def from_similarity_df(cls, similarities, game_column, k):
+        """Creates the index from a dense cosine similarity dataframe by sorting every column once
+        Args:
+            similarities: obj:`pandas DataFrame` Cosine similarity dataframe with the game ids in `game_column`
+            game_column: obj:`String` Name of the column that contains the game ids
+            k: obj:`int` Number of neighbors to keep for every game
+        Returns:
+            obj:`NeighborIndex`
+        """
+        if not isinstance(similarities, pd.DataFrame):
+            logger.error("%s is not a Pandas Dataframe object", similarities)
+            raise TypeError("Provided argument `similarities` is not a Panda's DataFrame object")
+
+        similarities = similarities.sort_values(game_column)
+        ids = similarities[game_column].to_numpy()
+        values = similarities[[str(game_id) for game_id in ids]].to_numpy()
+        # The most similar game is the game itself, so it is skipped
+        neighbors = np.argsort(-values, axis=0, kind='stable')[1:k + 1].T
+        return cls(ids, ids[neighbors], np.take_along_axis(values.T, neighbors, axis=1))
+
+    def lookup(self, game_id, k):
+        """Returns the ids of the `k` games most similar to `game_id`
+        Args:
+            game_id: obj:`int` ID given to the game by Steam
+            k: obj:`int` Number of games to return
+        Returns:
+            obj:`List[int]` Game ids ordered by decreasing similarity
+        """
+        game_id = int(game_id)
+        row = np.searchsorted(self.ids, game_id)
+        if row == len(self.ids) or self.ids[row] != game_id:
+            raise KeyError(game_id)
+        return self.neighbor_ids[row, :k].tolist()
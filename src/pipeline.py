@@ -0,0 +1,465 @@
+import collections
+import concurrent.futures
+import functools
+import logging
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src import profiling
+from src.artifacts import count_rows, read_frame, write_frame
+from src.create_db import games_table_state
+from src.get_data import download_s3, s3_etag, upload
+from src.ingest_data import ingest_data
+from src.memory_plan import check_dense_similarity, check_model_memory, parse_memory_budget, plan_block_size, \
+    plan_interactions
+from src.model import run_model, cosine_similarity_matrix, evaluate_model, top_k_neighbors, update_model
+from src.model_store import PARAMS_FILE, load_model, save_model
+from src.neighbors import write_neighbors
+from src.process_data import accumulate_user_items, create_games_csv, create_interaction_matrix, \
+    filter_user_games, json_generator, read_games_json, stream_interaction_matrix
+from src.stage_cache import StageCache
+
+logger = logging.getLogger(__name__)
+
+# A stage of the model pipeline. `run` executes the stage, `inputs` and `outputs` are the files it reads and writes
+# and `params` returns the configuration it depends on, which together decide whether it can be skipped. `deps` are
+# the names of the stages that write its inputs and have to finish before it starts. `params` returns None when
+# something the stage depends on could not be checked, and the stage then always runs. A stage with `fingerprint_after`
+# changes the state its `params` read, such as the database written by ingest, so its fingerprint is taken after it runs
+Stage = collections.namedtuple('Stage', ['run', 'inputs', 'params', 'outputs', 'deps', 'fingerprint_after'],
+                               defaults=[False])
+
+
+def download_games(config):
+    """Downloads the raw games data from S3
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    download_s3(**config['process_data']['steam_game_data']['s3_download'])
+
+
+def download_users(config):
+    """Downloads the raw user data from S3
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    download_s3(**config['process_data']['steam_user_data']['s3_download'])
+
+
+def process_games(config):
+    """Creates the processed games data from the raw json file and uploads it to S3
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    games_config = config['process_data']['steam_game_data']
+    logger.debug("Creating csv from json for the Steam games data")
+    games_df = read_games_json(games_config['input'], **games_config['create_games_csv'])
+    games_df = create_games_csv(games_df, **games_config['create_games_csv'])
+    write_frame(games_df, games_config['output'], games_config['output_dtypes'])
+    logger.info("Games data has been processed successfully and can be found at %s", games_config['output'])
+    upload(**games_config['upload'])
+
+
+def parse_users(config):
+    """Parses the raw user json file into user/game pairs, which does not depend on the games data, and saves the steam
+    user id of every user number
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    users_config = config['process_data']['steam_user_data']
+    logger.debug("Converting json to Dataframe with generator function")
+    with profiling.step('parse_users.json') as record:
+        user_ids, pairs = accumulate_user_items(json_generator(users_config['input']),
+                                                **users_config['accumulate_user_items'])
+        record['items'] = len(user_ids)
+    write_frame(pairs, users_config['parsed'])
+    columns = users_config['accumulate_user_items']
+    write_frame(pd.DataFrame({columns['user_column']: np.arange(len(user_ids), dtype=np.int32),
+                              columns['user_id_column']: pd.Series(user_ids, dtype=str)}), users_config['users'])
+    logger.info("Parsed user/game pairs were saved to %s and the steam user ids to %s", users_config['parsed'],
+                users_config['users'])
+
+
+def process_users(config):
+    """Creates the long user_games data from the parsed user/game pairs and the processed games data
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    games_config = config['process_data']['steam_game_data']
+    users_config = config['process_data']['steam_user_data']
+    columns = users_config['create_users_games_csv']
+    games_df = read_frame(games_config['output'], [columns['new_item_column'], columns['title_column']])
+    pairs = read_frame(users_config['parsed'])
+    user_games_df = filter_user_games(pairs, games_df, columns['new_item_column'], columns['rating_column'],
+                                      columns['title_column'])
+    write_frame(user_games_df, users_config['output'], users_config['output_dtypes'])
+    logger.info("User_Games data has been processed successfully and can be found at %s", users_config['output'])
+
+
+def build_interactions(config):
+    """Creates the sparse interaction matrix from the long user_games data and saves it. With a memory budget, the
+    matrix is streamed from disk only when building it in memory would not fit in the budget.
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    model_config = config['model']
+    stream, chunk_size = model_config['stream']['enabled'], model_config['stream']['chunk_size']
+    budget = parse_memory_budget(model_config['memory_budget'])
+    if budget is not None:
+        try:
+            stream, chunk_size = plan_interactions(count_rows(model_config['only']['user_games_path']), budget)
+
+        except FileNotFoundError:
+            logger.error("Could not find file %s, make sure the path name is correct",
+                         model_config['only']['user_games_path'])
+            sys.exit(3)
+
+    logger.debug("Creating sparse matrix containing interactions between users and games")
+    if stream:
+        interactions = stream_interaction_matrix(model_config['only']['user_games_path'],
+                                                 chunk_size=chunk_size,
+                                                 scratch_dir=model_config['stream']['scratch_dir'],
+                                                 **model_config['interactions'])
+    else:
+        try:
+            user_games_df = read_frame(model_config['only']['user_games_path'],
+                                       [model_config['interactions']['user_column'],
+                                        model_config['interactions']['game_column'],
+                                        model_config['interactions']['rating_column']])
+
+        except FileNotFoundError:
+            logger.error("Could not find file %s, make sure the path name is correct",
+                         model_config['only']['user_games_path'])
+            sys.exit(3)
+
+        except Exception as e:
+            logger.error(e)
+            sys.exit(3)
+
+        interactions = create_interaction_matrix(user_games_df, **model_config['interactions'])
+
+    with profiling.step('save_npz', interactions.nnz):
+        sparse.save_npz(model_config['filepaths']['interactions'], interactions.tocsr())
+    logger.info("Interaction matrix was saved to %s", model_config['filepaths']['interactions'])
+
+
+def _early_stopping(config):
+    """Whether the evaluate stage chooses the number of epochs used by the train stage"""
+    return bool((config['model']['evaluate_model'].get('early_stopping') or {}).get('enabled'))
+
+
+def evaluate(config):
+    """Trains and evaluates a LightFM model on a split of the interactions and saves the test AUC. With early stopping,
+    the number of epochs with the best validation AUC is also saved for the train stage
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    interactions = sparse.load_npz(config['model']['filepaths']['interactions'])
+    budget = parse_memory_budget(config['model']['memory_budget'])
+    if budget is not None:
+        check_model_memory(*interactions.shape, interactions.nnz, config['model']['evaluate_model']['n_components'],
+                           budget, evaluation=True)
+    logger.info("Training and Evaluating LightFM Model")
+    test_auc, epochs = evaluate_model(interactions, **config['model']['evaluate_model'])
+    logger.info("Test set had AUC score of %s after %d epochs", str(test_auc), epochs)
+
+    outputs = [(config['model']['filepaths']['auc_txt'], test_auc)]
+    if _early_stopping(config):
+        outputs.append((config['model']['filepaths']['best_epoch'], epochs))
+    for filepath, value in outputs:
+        try:
+            with open(filepath, 'w') as f:
+                f.write(str(value))
+
+        except OSError:
+            logger.error("Could not open: %s", filepath)
+            sys.exit(3)
+
+
+def train(config):
+    """Trains the LightFM model on all interactions and saves the model and its item embeddings. With early stopping,
+    the number of epochs found by the evaluate stage replaces `run_model.epoch`. In incremental mode, the saved model is
+    updated with the new users, games and interactions instead, see `update_model`
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    filepaths = config['model']['filepaths']
+    store_config = config['model']['model_store']
+    interactions = sparse.load_npz(filepaths['interactions'])
+    try:
+        user_ids = np.load(filepaths['user_ids'])
+        with open(filepaths['item_names'], 'rb') as f:
+            item_ids = pickle.load(f)
+
+    except FileNotFoundError:
+        logger.error("Files containing the user and game ids were not found, please rerun the interactions stage")
+        sys.exit(3)
+
+    budget = parse_memory_budget(config['model']['memory_budget'])
+    if budget is not None:
+        check_model_memory(*interactions.shape, interactions.nnz, config['model']['run_model']['n_components'], budget)
+
+    model = _incremental_model(config, interactions, user_ids, item_ids) if store_config['incremental'] else None
+    if model is None:
+        model = _full_model(config, interactions)
+
+    save_model(model, store_config['directory'], user_ids, item_ids, interactions)
+    with profiling.step('save_embeddings', len(model.item_embeddings)):
+        np.save(filepaths['item_embeddings'], model.item_embeddings)
+    logger.info("Item embeddings were saved to %s", filepaths['item_embeddings'])
+
+
+def _incremental_model(config, interactions, user_ids, item_ids):
+    """Loads the saved model and updates it with the new interactions. Returns None if there is no saved model to
+    start from, or if it was trained with a different number of components or loss"""
+    store_config = config['model']['model_store']
+    run_model_config = config['model']['run_model']
+    try:
+        model, model_user_ids, model_item_ids, previous = load_model(store_config['directory'],
+                                                                     run_model_config['random_state'])
+
+    except FileNotFoundError:
+        logger.warning("No saved model was found in %s, training a new model on all interactions",
+                       store_config['directory'])
+        return None
+
+    if model.no_components != run_model_config['n_components'] or model.loss != run_model_config['loss']:
+        logger.warning("The saved model was trained with other model settings, training a new model on all "
+                       "interactions")
+        return None
+
+    logger.info("Updating the saved LightFM model with the new interactions")
+    model, _ = update_model(model, model_user_ids, model_item_ids, previous, interactions, user_ids, item_ids,
+                            store_config['incremental_epoch'], run_model_config['n_jobs'])
+    return model
+
+
+def _full_model(config, interactions):
+    """Trains a new model on all interactions"""
+    run_model_config = dict(config['model']['run_model'])
+    if _early_stopping(config):
+        try:
+            with open(config['model']['filepaths']['best_epoch']) as f:
+                run_model_config['epoch'] = int(f.read())
+
+        except FileNotFoundError:
+            logger.error("File containing the best number of epochs was not found, please rerun the evaluate stage")
+            sys.exit(3)
+        logger.info("Using the %d epochs with the best validation AUC", run_model_config['epoch'])
+
+    logger.info("Training LightFM model on full dataset")
+    return run_model(interactions, **run_model_config)
+
+
+def similarity(config):
+    """Finds the most similar games from the item embeddings and uploads the result to S3
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+    Returns:
+        None
+    """
+    model_config = config['model']
+    item_embeddings = np.load(model_config['filepaths']['item_embeddings'])
+    try:
+        with open(model_config['filepaths']['item_names'], 'rb') as f:
+            item_names = pickle.load(f)
+
+    except FileNotFoundError:
+        logger.error("File containing the game ids was not found, please rerun the model section to create the file")
+        sys.exit(3)
+
+    logger.debug("Creating cosine similarity matrix")
+    budget = parse_memory_budget(model_config['memory_budget'])
+    if model_config['similarity']['method'] == 'top_k':
+        block_size = model_config['similarity']['block_size']
+        if budget is not None:
+            block_size = plan_block_size(*item_embeddings.shape, budget, block_size)
+        neighbors, scores = top_k_neighbors(item_embeddings, model_config['similarity']['k'], block_size)
+        with profiling.step('write_neighbors', len(item_names)):
+            write_neighbors(model_config['filepaths']['neighbors'], item_names, neighbors, scores)
+        upload(**model_config['upload_neighbors'])
+    else:
+        if budget is not None:
+            check_dense_similarity(len(item_embeddings), budget)
+        cosine_matrix = cosine_similarity_matrix(item_embeddings, item_names)
+        with profiling.step('to_csv', len(cosine_matrix)):
+            cosine_matrix.to_csv(model_config['filepaths']['cosine_matrix'])
+        logger.info("Cosine similarity dataframe was created successfully and saved to %s",
+                    model_config['filepaths']['cosine_matrix'])
+        upload(**model_config['upload'])
+
+
+def pipeline_stages(config, engine_string):
+    """Describes every stage of the model pipeline and the stages it depends on, in the order they run when there is
+    a single worker
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+        engine_string: obj:`String` SQLAlchemy connection URI for the database used by the ingest stage
+    Returns:
+        obj:`OrderedDict[String, Stage]` Stages by name
+    """
+    games_config = config['process_data']['steam_game_data']
+    users_config = config['process_data']['steam_user_data']
+    model_config = config['model']
+    filepaths = model_config['filepaths']
+    similarity_output = filepaths['neighbors'] if model_config['similarity']['method'] == 'top_k' \
+        else filepaths['cosine_matrix']
+
+    def s3_params(data_config):
+        def params():
+            etag = s3_etag(data_config['s3_download']['bucket_name'], data_config['s3_download']['bucket_filepath'])
+            return None if etag is None else {'etag': etag, 'config': data_config['s3_download']}
+        return params
+
+    def ingest_params():
+        state = games_table_state(engine_string)
+        return None if state is None else {'ingest': config['ingest'], 'engine_string': engine_string, 'table': state}
+
+    return collections.OrderedDict([
+        ('download_games', Stage(
+            functools.partial(download_games, config), [], s3_params(games_config), [games_config['input']], [])),
+        ('download_users', Stage(
+            functools.partial(download_users, config), [], s3_params(users_config), [users_config['input']], [])),
+        ('process_games', Stage(
+            functools.partial(process_games, config), [games_config['input']],
+            lambda: {key: games_config[key] for key in ('create_games_csv', 'upload', 'output', 'output_dtypes')},
+            [games_config['output']], ['download_games'])),
+        ('parse_users', Stage(
+            functools.partial(parse_users, config), [users_config['input']],
+            lambda: {key: users_config[key] for key in ('accumulate_user_items', 'create_users_games_csv', 'parsed',
+                                                        'users')},
+            [users_config['parsed'], users_config['users']], ['download_users'])),
+        ('process_users', Stage(
+            functools.partial(process_users, config), [games_config['output'], users_config['parsed']],
+            lambda: {key: users_config[key] for key in ('create_users_games_csv', 'output', 'output_dtypes')},
+            [users_config['output']], ['process_games', 'parse_users'])),
+        ('interactions', Stage(
+            functools.partial(build_interactions, config),
+            [filepath for filepath in [model_config['only']['user_games_path'],
+                                       model_config['interactions']['user_lookup_filepath']] if filepath is not None],
+            lambda: {'interactions': model_config['interactions'], 'stream': model_config['stream'],
+                     'memory_budget': model_config['memory_budget']},
+            [filepaths['interactions'], filepaths['item_names'], filepaths['user_ids']], ['process_users'])),
+        ('evaluate', Stage(
+            functools.partial(evaluate, config), [filepaths['interactions']],
+            lambda: model_config['evaluate_model'],
+            [filepaths['auc_txt']] + ([filepaths['best_epoch']] if _early_stopping(config) else []),
+            ['interactions'])),
+        ('train', Stage(
+            functools.partial(train, config),
+            [filepaths['interactions'], filepaths['user_ids'], filepaths['item_names']] +
+            ([filepaths['best_epoch']] if _early_stopping(config) else []),
+            lambda: {'run_model': model_config['run_model'], 'model_store': model_config['model_store']},
+            [filepaths['item_embeddings'], os.path.join(model_config['model_store']['directory'], PARAMS_FILE)],
+            ['interactions'] + (['evaluate'] if _early_stopping(config) else []))),
+        ('similarity', Stage(
+            functools.partial(similarity, config), [filepaths['item_embeddings'], filepaths['item_names']],
+            lambda: {'similarity': model_config['similarity'], 'upload': model_config['upload'],
+                     'upload_neighbors': model_config['upload_neighbors']},
+            [similarity_output], ['interactions', 'train'])),
+        ('ingest', Stage(
+            functools.partial(ingest_data, engine_string, **config['ingest']), [config['ingest']['games_filepath']],
+            ingest_params, [], ['process_games'], True)),
+    ])
+
+
+def run_pipeline(config, engine_string, stage_names, use_cache=True, max_workers=1, profile=False, cprofile=False):
+    """Runs stages of the model pipeline. A stage starts once the stages it depends on have finished, so independent
+    stages such as the two downloads, or the evaluation and the final training, run at the same time in separate
+    processes. Dependencies on stages that are not in `stage_names` are assumed to be satisfied. When the stage cache
+    is enabled, a stage whose input files and configuration are unchanged since it last ran is skipped and its saved
+    outputs are reused. With profiling, the wall time, CPU time, peak memory and throughput of every stage and of the
+    steps inside it are saved to the json report set by `profile.report`.
+    Args:
+        config: obj:`Dict` Pipeline configuration loaded from config.yaml
+        engine_string: obj:`String` SQLAlchemy connection URI for the database used by the ingest stage
+        stage_names: obj:`List[String]` Names of the stages to run, see `pipeline_stages`
+        use_cache: obj:`Boolean` Whether unchanged stages should be skipped
+        max_workers: obj:`int` Maximum number of stages that run at the same time. With a single worker the stages run
+            one after the other in the order of `stage_names`, in this process
+        profile: obj:`Boolean` Whether to save a profiling report
+        cprofile: obj:`Boolean` Whether to also save a cProfile dump of every stage to `profile.cprofile_dir`
+    Returns:
+        None
+    """
+    stages = pipeline_stages(config, engine_string)
+    cache = StageCache(config['stage_cache']['manifest']) if use_cache and config['stage_cache']['enabled'] else None
+    waiting = collections.OrderedDict((name, [dep for dep in stages[name].deps if dep in stage_names])
+                                      for name in stage_names)
+    finished = set()
+    running = {}
+    records = []
+    cprofile_dir = config['profile']['cprofile_dir'] if cprofile else None
+    pipeline_start = time.perf_counter()
+
+    if max_workers > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    try:
+        while waiting or running:
+            ready = [name for name, deps in waiting.items() if all(dep in finished for dep in deps)]
+            for name in ready:
+                del waiting[name]
+                stage = stages[name]
+                fingerprint = cache.fingerprint(name, stage.inputs, stage.params()) if cache else None
+                if cache is not None and cache.is_fresh(name, fingerprint, stage.outputs):
+                    logger.info("Skipping stage %s, its inputs and configuration are unchanged", name)
+                    records.append({'name': name, 'stage': True, 'skipped': True})
+                    finished.add(name)
+                    continue
+
+                logger.debug("Running stage %s", name)
+                run = functools.partial(profiling.run_stage, name, stage.run, cprofile_dir) if profile else stage.run
+                running[executor.submit(run)] = (name, fingerprint, time.perf_counter())
+
+            if not running:
+                continue
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint, start = running.pop(future)
+                try:
+                    result = future.result()
+                except BaseException:
+                    logger.error("Stage %s failed, stopping the pipeline", name)
+                    raise
+
+                logger.info("Finished stage %s in %.1f seconds", name, time.perf_counter() - start)
+                if profile:
+                    records.extend(result)
+                if cache is not None:
+                    if stages[name].fingerprint_after:
+                        fingerprint = cache.fingerprint(name, stages[name].inputs, stages[name].params())
+                    cache.record(name, fingerprint)
+                finished.add(name)
+
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if profile:
+        profiling.write_report(config['profile']['report'], records, stages=stage_names, max_workers=max_workers,
+                               wall_seconds=round(time.perf_counter() - pipeline_start, 6))
@@ -1,24 +1,46 @@
+import array
 import json
 import logging
+import os
 import pickle
 import sys
+import tempfile
 
 import numpy as np
 import pandas as pd
 from scipy import sparse
 
+from src import profiling
+from src.artifacts import iter_frame_chunks, read_frame
+
 logger = logging.getLogger(__name__)
 
 
-def json_generator(file_name):
-    """Generator function that yields one line of the json file at a time"""
+def is_json_lines(file_name):
+    """Checks whether a json file contains one record per line instead of a single json array"""
+    with open(file_name) as fh:
+        for line in fh:
+            if line.strip():
+                return not line.lstrip().startswith('[')
+    return True
+
+
+def json_generator(file_name, read_size=1048576):
+    """Generator function that yields one record of the json file at a time. JSON Lines files are read line by line
+    and json arrays are decoded incrementally from blocks of `read_size` characters, so the whole file is never held
+    in memory"""
     try:
+        lines = is_json_lines(file_name)
         with open(file_name) as fh:
-            for line in json.load(fh):
-                yield line
+            if lines:
+                for line in fh:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from _iter_json_array(fh, read_size)
 
     except OSError:
-        logger.error("Could not read json file: %s", fh)
+        logger.error("Could not read json file: %s", file_name)
         sys.exit(3)
 
     except Exception as e:
@@ -26,11 +48,131 @@ def json_generator(file_name):
         sys.exit(3)
 
 
+def _iter_json_array(fh, read_size):
+    """Yields the elements of the json array in an open file while only keeping a block of the file in memory"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof, started = '', 0, False, False
+
+    while True:
+        separators = ' \t\r\n,' if started else ' \t\r\n'
+        while pos < len(buffer) and buffer[pos] in separators:
+            pos += 1
+
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("%s does not contain a json array" % fh.name)
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+
+            # A record that fails to decode or reaches the end of the block may continue in the next block
+            if end is not None and (end < len(buffer) or eof):
+                yield record
+                pos = end
+                continue
+
+        if eof:
+            raise ValueError("Unexpected end of json array in %s" % fh.name)
+        chunk = fh.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def accumulate_user_items(records, user_id_column, old_item_column, temp_column, user_column, new_item_column):
+    """
+    Parses the owned games of every user from a stream of user records straight into int32 user/game pairs. Only the
+    user id and the id of each owned game are kept: the game ids of all users are appended to one flat int32 buffer
+    and the number of games of every user to another while the records are read, so memory grows by a few bytes per
+    owned game instead of a Python object, and no second pass over the records is needed. Users are numbered in the
+    order their steam user id first appears, and repeated records of a user are skipped, so the returned steam user
+    ids map the numbers back to users that stay the same between dumps. This step does not need the games data, so it
+    can run while the games data is processed.
+
+    Args:
+        records: obj:`Iterable[Dict]` User records, as yielded by `json_generator`
+        user_id_column: obj:`String` String that specifies the name of the field that contains the steam user id
+        old_item_column: obj:`String` String specifying the name of the field that contains the list of owned games
+        temp_column: obj:`String` String that specifies the name of the field that contains the id of an owned game
+        user_column: obj:`String` String that specifies the name of the new column containing the user number
+        new_item_column: obj:`String` String that specifies the name of the new column containing individual game ids
+
+    Returns:
+        user_ids: obj:`List[String]` Steam user id of every user, in the order of their numbers
+        pairs: obj:`pandas DataFrame` int32 user/game pairs
+    """
+    user_ids = []
+    seen = set()
+    counts = array.array('i')
+    item_ids = array.array('i')
+    try:
+        for record in records:
+            if record[user_id_column] in seen:
+                continue
+            seen.add(record[user_id_column])
+            user_ids.append(record[user_id_column])
+            start = len(item_ids)
+            item_ids.extend(int(item[temp_column]) for item in record[old_item_column])
+            counts.append(len(item_ids) - start)
+
+    except KeyError:
+        logger.error("One of the column names specified in the users/games processing step is incorrect")
+        sys.exit(3)
+
+    except (TypeError, ValueError) as e:
+        logger.error("%s, the owned game ids must be integers", e)
+        sys.exit(3)
+
+    logger.debug("Created %d user/game pairs from %d users", len(item_ids), len(user_ids))
+    uids = np.repeat(np.arange(len(user_ids), dtype=np.int32), np.frombuffer(counts, dtype=np.int32))
+    return user_ids, pd.DataFrame({user_column: uids, new_item_column: np.frombuffer(item_ids, dtype=np.int32)})
+
+
+def read_games_json(file_name, game_columns, game_id_column):
+    """
+    Reads the games json file one record at a time, keeping only the columns in `game_columns` and the first record of
+    every game id. Peak memory therefore depends on the projected columns instead of the full raw records.
+
+    Args:
+        file_name: obj:`String` Filepath to the games json file
+        game_columns: obj:`List[String]` Names of the columns needed for data ingestion
+        game_id_column: obj:`String` String that specifies the name of the column that contains the steam game id.
+
+    Returns:
+        df: obj:`pandas DataFrame` Dataframe with the projected columns of every unique game
+    """
+    columns = {column: [] for column in game_columns}
+    seen_ids = set()
+    skipped = 0
+
+    for record in json_generator(file_name):
+        game_id = record.get(game_id_column)
+        if game_id is None or game_id in seen_ids:
+            skipped += 1
+            continue
+        seen_ids.add(game_id)
+        for column in game_columns:
+            columns[column].append(record.get(column))
+
+    logger.debug("Read %d games from %s, skipped %d records without id or with a duplicated id", len(seen_ids),
+                 file_name, skipped)
+    return pd.DataFrame(columns)
+
+
 def create_games_csv(df, game_columns, game_id_column):
     """
     Reads the json file into a pandas dataframe. Removes duplicate games to prepare for data ingestion, subsets the
-    columns that are needed for the database and fills the NA values with strings to prevent errors during data
-    ingestion.
+    columns that are needed for the database, fills the NA values with strings and turns lists into strings to prevent
+    errors during data ingestion.
 
     Args:
         df: obj:`pandas DataFrame` DataFrame created from the games json file that is uncleaned
@@ -51,6 +193,9 @@ def create_games_csv(df, game_columns, game_id_column):
         df = df.dropna(subset=[game_id_column])
         df = df.drop_duplicates(game_id_column)
         df = df.fillna('')
+        # Store list fields such as genres as text so they can be saved to any artifact format and the database
+        for column in game_columns:
+            df[column] = df[column].map(lambda value: str(value) if isinstance(value, list) else value)
 
     except KeyError:
         logger.error("%s not found in dataframe columns, make sure it is spelled correctly", game_id_column)
@@ -67,11 +212,10 @@ def create_games_csv(df, game_columns, game_id_column):
 def create_user_games_csv(user_df, game_df, old_item_column, user_column, new_item_column,
                           rating_column, title_column, temp_column):
     """
-    Reads the input json file in to create the user_games dataframe. Due to the size of the file, the parse generator
-    function is used to go row by row and avoid RAM limitations. The newly created user_games dataframe is changed into
-    a long format where each row contains a user id, game id, and whether the game is owned or not. The long dataframe
-    is filtered by games in the game json file to remove rows where the game id is missing. The resulting dataframe is
-    then saved as a csv file.
+    Changes the user_games dataframe into a long format where each row contains a user id, game id, and whether the
+    game is owned or not. The owned game ids are parsed into int32 pairs by `accumulate_user_items`, and pairs
+    whose game is missing from the games data are removed with a sorted membership test instead of a merge with the
+    games dataframe.
 
     Args:
         user_df: obj:`pandas DataFrame` Dataframe containing the user/games owned data
@@ -81,7 +225,7 @@ def create_user_games_csv(user_df, game_df, old_item_column, user_column, new_it
         new_item_column: obj:`String` String that specifies the name of the new column containing individual game ids
         rating_column: obj:`String` String that specifies the name of the column representing if a game is owned
         title_column: obj:`String` String that specifies the name of the columns that contains the game name
-        temp_column: obj:`String` Temporary column name that is used in calculations and renamed to new_item_column
+        temp_column: obj:`String` String that specifies the name of the field that contains the id of an owned game
     Returns:
         df :obj: `pandas DataFrame` The long user_game dataframe to be turned into a sparse matrix
     """
@@ -89,22 +233,29 @@ def create_user_games_csv(user_df, game_df, old_item_column, user_column, new_it
         logger.error("%s is not a Pandas Dataframe object", user_df)
         raise TypeError("Provided argument `df` is not a Panda's DataFrame object")
 
+    records = ({user_column: uid, old_item_column: items} for uid, items in enumerate(user_df[old_item_column]))
+    _, pairs = accumulate_user_items(records, user_column, old_item_column, temp_column, user_column, new_item_column)
+    return filter_user_games(pairs, game_df, new_item_column, rating_column, title_column)
+
+
+def filter_user_games(pairs, game_df, new_item_column, rating_column, title_column):
+    """
+    Removes the user/game pairs whose game is missing from the games data, or has no title, and marks the remaining
+    games as owned.
+
+    Args:
+        pairs: obj:`pandas DataFrame` User/game pairs created by `accumulate_user_items`
+        game_df: obj:`pandas DataFrame` Dataframe containing the game information data
+        new_item_column: obj:`String` String that specifies the name of the column containing individual game ids
+        rating_column: obj:`String` String that specifies the name of the column representing if a game is owned
+        title_column: obj:`String` String that specifies the name of the columns that contains the game name
+    Returns:
+        df :obj: `pandas DataFrame` The long user_game dataframe to be turned into a sparse matrix
+    """
     try:
-        # Find items from list of dictionaries in the old item column
-        user_df[temp_column] = user_df[old_item_column].apply(lambda x: [x[index][temp_column] for
-                                                                         index, _ in enumerate(x)])
-        user_df[user_column] = np.arange(len(user_df))
-        df = user_df[[user_column, temp_column]]
-        lst_col = temp_column
-        logger.debug("Creating long dataframe from user_games data")
-        # Expand the list of items to create a long version of the dataframe
-        df = pd.DataFrame({col: np.repeat(df[col].values, df[lst_col].str.len())
-                           for col in df.columns.difference([lst_col])
-                           }).assign(**{lst_col: np.concatenate(df[lst_col].values)})[df.columns.tolist()]
-        # Specify that the game is owned with a "1"
-        df[rating_column] = np.ones(shape=df.shape[0])
-        df[temp_column] = df[temp_column].astype(int)
-        df = df.rename(columns={temp_column: new_item_column})
+        titled_games = game_df.loc[game_df[title_column].notna(), new_item_column]
+        known_ids = np.unique(pd.to_numeric(titled_games, errors='coerce').dropna().to_numpy(dtype=np.int64))
+        owned = np.isin(pairs[new_item_column].to_numpy(), known_ids)
 
     except KeyError:
         logger.error("One of the column names specified in the users/games processing step is incorrect")
@@ -114,12 +265,9 @@ def create_user_games_csv(user_df, game_df, old_item_column, user_column, new_it
         logger.error(e)
         sys.exit(3)
 
-    df_orig_len = len(df)
-    logger.debug("Merging games data and user_games data to filter games that don't exist in games data")
-    df = pd.merge(df, game_df, on=new_item_column)
-    df = df.dropna(axis=0, subset=[title_column])
-    logger.debug("Dropped %d rows from the original dataset", df_orig_len - len(df))
-    df = df[[user_column, new_item_column, rating_column]]
+    logger.debug("Dropped %d rows from the original dataset", len(owned) - owned.sum())
+    df = pairs[owned].reset_index(drop=True)
+    df[rating_column] = np.ones(len(df), dtype=np.uint8)
     return df
 
 
@@ -154,9 +302,10 @@ def make_sparse(df, user_column, game_column, rating_column, chunk_size):
     try:
         for i in range(chunks):
             user_chunk = users[i * chunk_size:(i + 1) * chunk_size]
-            user_subset = df[df[user_column].isin(user_chunk)].pivot(index=user_column,
-                                                                     columns=game_column, values=rating_column)
-            sparse_users = sparse.csr_matrix(df_base.append(user_subset).fillna(0))
+            with profiling.step('make_sparse.chunk', len(user_chunk)):
+                user_subset = df[df[user_column].isin(user_chunk)].pivot(index=user_column,
+                                                                         columns=game_column, values=rating_column)
+                sparse_users = sparse.csr_matrix(df_base.append(user_subset).fillna(0))
             yield sparse_users
 
     except MemoryError:
@@ -167,49 +316,213 @@ def make_sparse(df, user_column, game_column, rating_column, chunk_size):
         sys.exit(3)
 
 
-def create_interaction_matrix(df, user_column, game_column, rating_column, chunk_size,
-                              game_id_txt_filepath):
+def build_interaction_matrix(df, user_column, game_column, rating_column):
     """
-    Creates the interaction sparse matrix from the user_game long dataframe. Due to memory constraints the generator
-    function "make_sparse" is used to limit the amount of rows processed at one time. In addition, the game ids are
-    saved to a text file in order to name the cosine similarity matrix.
+    Builds the interaction sparse matrix from the long user_game dataframe in a single vectorized pass. The user and
+    game ids are factorized into integer codes which are used directly as the row and column coordinates of the
+    matrix, so no dense blocks the width of the game catalog are ever created.
 
     Args:
         df: obj:`pandas DataFrame` The long user_game dataframe to be turned into a sparse matrix
         user_column: obj:`String` String that specifies the name of the column that contains the steam user id
         game_column: obj:`String` String that specifies the name of the new column containing the game ids
         rating_column: obj:`String` String that specifies the name of the column representing if a game is owned
-        chunk_size: obj:`int` How many users to process at one time
-        game_id_txt_filepath: obj:`String` Filepath to where the game id text file is saved to
 
     Returns:
-        sparse_matrix: obj:`scipy.sparse.scr_matrix` Sparse matrix containing the interactions between users and games
+        sparse_matrix: obj:`scipy.sparse.csr_matrix` Sparse matrix containing the interactions between users and games
+        users: obj:`Numpy Array` User ids in the order of the rows of the sparse matrix
+        items: obj:`Numpy Array` Game ids in the order of the columns of the sparse matrix
     """
     if not isinstance(df, pd.DataFrame):
         logger.error("%s is not a Pandas Dataframe object", df)
         raise TypeError("Provided argument `df` is not a Panda's DataFrame object")
 
     try:
-        items = sorted(df[game_column].unique())
-        num_columns = len(items)
+        user_codes, users = pd.factorize(df[user_column], sort=True)
+        item_codes, items = pd.factorize(df[game_column], sort=True)
+        ratings = df[rating_column].to_numpy(dtype=np.float32)
 
     except KeyError:
-        logger.error("%s not found in dataframe, make sure the column name is spelled correctly", game_column)
+        logger.error("One of the column names specified in the interaction matrix step is incorrect")
         sys.exit(3)
 
     except Exception as e:
         logger.error(e)
         sys.exit(3)
 
+    logger.debug("Creating sparse matrix with %d users, %d games and %d interactions", len(users), len(items), len(df))
+    with profiling.step('build_interaction_matrix', len(df)):
+        sparse_matrix = sparse.csr_matrix((ratings, (user_codes.astype(np.int32), item_codes.astype(np.int32))),
+                                          shape=(len(users), len(items)))
+
+    return sparse_matrix, np.asarray(users), np.asarray(items)
+
+
+def create_interaction_matrix(df, user_column, game_column, rating_column, game_id_txt_filepath,
+                              user_id_filepath=None, user_lookup_filepath=None, user_id_column=None):
+    """
+    Creates the interaction sparse matrix from the user_game long dataframe using `build_interaction_matrix`. In
+    addition, the game ids are saved to a text file in order to name the cosine similarity matrix, and the user ids
+    can be saved to a .npy file so a saved model can be matched to the rows of a newer matrix, see `_save_user_ids`.
+
+    Args:
+        df: obj:`pandas DataFrame` The long user_game dataframe to be turned into a sparse matrix
+        user_column: obj:`String` String that specifies the name of the column that contains the steam user id
+        game_column: obj:`String` String that specifies the name of the new column containing the game ids
+        rating_column: obj:`String` String that specifies the name of the column representing if a game is owned
+        game_id_txt_filepath: obj:`String` Filepath to where the game id text file is saved to
+        user_id_filepath: obj:`String` Filepath to where the user ids are saved to, or None to not save them
+        user_lookup_filepath: obj:`String` Filepath to the steam user id of every user number, saved by the
+            parse_users stage, or None to save the user numbers instead
+        user_id_column: obj:`String` String that specifies the name of the column of the lookup that contains the
+            steam user id
+
+    Returns:
+        sparse_matrix: obj:`scipy.sparse.csr_matrix` Sparse matrix containing the interactions between users and games
+    """
+    if not isinstance(df, pd.DataFrame):
+        logger.error("%s is not a Pandas Dataframe object", df)
+        raise TypeError("Provided argument `df` is not a Panda's DataFrame object")
+
+    logger.debug('Creating sparse matrix for model use')
+    sparse_matrix, users, items = build_interaction_matrix(df, user_column, game_column, rating_column)
+
     with open(game_id_txt_filepath, 'wb') as f:
-        pickle.dump(items, f)
+        pickle.dump(items.tolist(), f)
         logger.info("Saved game ids to %s", game_id_txt_filepath)
+    _save_user_ids(user_id_filepath, users, user_lookup_filepath, user_column, user_id_column)
+
+    logger.info('Successfully created sparse interaction matrix')
+    return sparse_matrix
 
-    sparse_matrix = sparse.eye(0, num_columns)
-    logger.debug('Creating sparse matrix for model use')
-    # Generator function to conserve memory
-    for user in make_sparse(df, user_column, game_column, rating_column, chunk_size):
-        sparse_matrix = sparse.vstack([sparse_matrix, user])
+
+def stream_interaction_matrix(user_games_filepath, user_column, game_column, rating_column, game_id_txt_filepath,
+                              chunk_size, scratch_dir=None, user_id_filepath=None, user_lookup_filepath=None,
+                              user_id_column=None):
+    """
+    Creates the interaction sparse matrix straight from the user_games file without loading the long dataframe
+    into memory. The file is read in chunks of `chunk_size` rows using only the needed columns with narrow dtypes. The
+    row, column and rating triplets of every chunk are appended to disk-backed arrays in `scratch_dir`, which are
+    converted to a CSR matrix once at the end. Rows and columns are ordered by user and game id so the result matches
+    `build_interaction_matrix`, and the game ids are saved to a text file in order to name the similarity matrix.
+
+    Args:
+        user_games_filepath: obj:`String` Filepath to the csv or columnar file containing the long user_game data
+        user_column: obj:`String` String that specifies the name of the column that contains the steam user id
+        game_column: obj:`String` String that specifies the name of the new column containing the game ids
+        rating_column: obj:`String` String that specifies the name of the column representing if a game is owned
+        game_id_txt_filepath: obj:`String` Filepath to where the game id text file is saved to
+        chunk_size: obj:`int` How many rows of the csv file to process at one time
+        scratch_dir: obj:`String` Directory where the temporary triplet arrays are stored. Defaults to the system
+            temporary directory
+        user_id_filepath: obj:`String` Filepath to where the user ids are saved to, or None to not save them
+        user_lookup_filepath: obj:`String` Filepath to the steam user id of every user number, saved by the
+            parse_users stage, or None to save the user numbers instead
+        user_id_column: obj:`String` String that specifies the name of the column of the lookup that contains the
+            steam user id
+
+    Returns:
+        sparse_matrix: obj:`scipy.sparse.csr_matrix` Sparse matrix containing the interactions between users and games
+    """
+    users = pd.Index([], dtype=np.int64)
+    items = pd.Index([], dtype=np.int64)
+    nnz = 0
+
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as tmp_dir:
+        paths = {name: os.path.join(tmp_dir, name + '.bin') for name in ('row', 'col', 'data')}
+        logger.debug("Streaming %s in chunks of %d rows", user_games_filepath, chunk_size)
+
+        try:
+            with open(paths['row'], 'wb') as row_file, open(paths['col'], 'wb') as col_file, \
+                    open(paths['data'], 'wb') as data_file:
+                reader = iter_frame_chunks(user_games_filepath, [user_column, game_column, rating_column], chunk_size,
+                                           {user_column: np.int32, game_column: np.int32, rating_column: np.float32})
+                for chunk in reader:
+                    with profiling.step('stream_interaction_matrix.chunk', len(chunk)):
+                        users = _extend_index(users, chunk[user_column])
+                        items = _extend_index(items, chunk[game_column])
+                        row_file.write(users.get_indexer(chunk[user_column]).astype(np.int32).tobytes())
+                        col_file.write(items.get_indexer(chunk[game_column]).astype(np.int32).tobytes())
+                        data_file.write(chunk[rating_column].to_numpy(dtype=np.float32).tobytes())
+                    nnz += len(chunk)
+
+        except FileNotFoundError:
+            logger.error("Could not find file %s, make sure the path name is correct", user_games_filepath)
+            sys.exit(3)
+
+        except ValueError as e:
+            logger.error("%s, one of the column names specified in the interaction matrix step is incorrect", e)
+            sys.exit(3)
+
+        except Exception as e:
+            logger.error(e)
+            sys.exit(3)
+
+        logger.debug("Creating sparse matrix with %d users, %d games and %d interactions", len(users), len(items), nnz)
+        if nnz == 0:
+            logger.warning("%s does not contain any interactions", user_games_filepath)
+            sparse_matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+        else:
+            rows = np.memmap(paths['row'], dtype=np.int32, mode='r', shape=(nnz,))
+            cols = np.memmap(paths['col'], dtype=np.int32, mode='r', shape=(nnz,))
+            data = np.memmap(paths['data'], dtype=np.float32, mode='r', shape=(nnz,))
+            sparse_matrix = sparse.coo_matrix((data, (rows, cols)), shape=(len(users), len(items))).tocsr()
+            del rows, cols, data
+
+    # Codes were assigned in order of appearance, reorder rows and columns by id
+    user_order = np.argsort(users.to_numpy(), kind='stable')
+    item_order = np.argsort(items.to_numpy(), kind='stable')
+    sparse_matrix = sparse_matrix[user_order]
+    item_position = np.empty_like(item_order)
+    item_position[item_order] = np.arange(len(item_order))
+    sparse_matrix.indices = item_position[sparse_matrix.indices].astype(sparse_matrix.indices.dtype)
+    sparse_matrix.has_sorted_indices = False
+    sparse_matrix.sort_indices()
+
+    with open(game_id_txt_filepath, 'wb') as f:
+        pickle.dump(items.to_numpy()[item_order].tolist(), f)
+        logger.info("Saved game ids to %s", game_id_txt_filepath)
+    _save_user_ids(user_id_filepath, users.to_numpy()[user_order], user_lookup_filepath, user_column, user_id_column)
 
     logger.info('Successfully created sparse interaction matrix')
     return sparse_matrix
+
+
+def _save_user_ids(user_id_filepath, users, user_lookup_filepath, user_column, user_id_column):
+    """Saves the user ids in the order of the rows of the interaction matrix, if a filepath is given. The user
+    numbers are only positions in one dump of the user data, so with a lookup the steam user ids are saved instead,
+    which still match when a later dump adds, removes or reorders users"""
+    if user_id_filepath is None:
+        return
+
+    if user_lookup_filepath is None:
+        user_ids = np.asarray(users, dtype=np.int64)
+    else:
+        try:
+            lookup = read_frame(user_lookup_filepath, [user_column, user_id_column], {user_id_column: str})
+            user_ids = lookup.set_index(user_column)[user_id_column].reindex(users)
+
+        except FileNotFoundError:
+            logger.error("Could not find file %s, please run the parse_users stage first", user_lookup_filepath)
+            sys.exit(3)
+
+        except (KeyError, ValueError) as e:
+            logger.error("%s, one of the column names specified in the interaction matrix step is incorrect", e)
+            sys.exit(3)
+
+        if user_ids.isna().any():
+            logger.error("%d users of the interaction matrix are missing from %s, please rerun the parse_users stage",
+                         user_ids.isna().sum(), user_lookup_filepath)
+            sys.exit(3)
+        user_ids = user_ids.to_numpy(dtype=str)
+
+    np.save(user_id_filepath, user_ids)
+    logger.info("Saved user ids to %s", user_id_filepath)
+
+
+def _extend_index(index, values):
+    """Appends the values that are not yet in `index` to the end of it so existing codes stay the same"""
+    new_values = pd.Index(pd.unique(values)).difference(index)
+    if len(new_values) == 0:
+        return index
+    return index.append(new_values)
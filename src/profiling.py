@@ -0,0 +1,184 @@
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import re
+import resource
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Profiling is off until `enable` is called, which makes `step` a cheap no-op in normal runs
+_enabled = False
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable():
+    """Starts recording the steps of the pipeline that run in this process
+    Returns:
+        None
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stops recording steps and returns the records collected so far
+    Returns:
+        obj:`List[Dict]` One record per finished step
+    """
+    global _enabled
+    _enabled = False
+    return collect()
+
+
+def collect():
+    """Returns and forgets the records of the steps that finished in this process
+    Returns:
+        obj:`List[Dict]` One record per finished step
+    """
+    global _records
+    with _lock:
+        records, _records = _records, []
+    return records
+
+
+@contextlib.contextmanager
+def step(name, items=None):
+    """Measures the wall time, CPU time and peak resident memory of a block of code when profiling is enabled. The
+    number of items processed can be given up front or set on the yielded record once it is known, and is used to
+    report the throughput of the step.
+    Args:
+        name: obj:`String` Name of the step
+        items: obj:`int` Number of rows, bytes or other items processed by the step
+    Yields:
+        obj:`Dict` Record of the step
+    """
+    record = {'name': name, 'items': items}
+    if not _enabled:
+        yield record
+        return
+
+    stack = _stack()
+    record['parent'] = stack[-1]['name'] if stack else None
+    # The high-water mark is reset for the new step, so the peak reached so far is kept by every running step first
+    _fold_peak_rss(stack)
+    record['peak_kb'] = 0
+    stack.append(record)
+    _reset_peak_rss()
+    start_kb = _peak_rss_kb()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        wall = time.perf_counter() - wall_start
+        # The peak of the step covers its children, since they added their peaks to every running step when they ended
+        _fold_peak_rss(stack)
+        peak_kb = record.pop('peak_kb')
+        stack.pop()
+        record.update({'wall_seconds': round(wall, 6), 'cpu_seconds': round(time.process_time() - cpu_start, 6),
+                       'peak_rss_mb': round(peak_kb / 1024, 1),
+                       'rss_increase_mb': round(max(peak_kb - start_kb, 0) / 1024, 1), 'pid': os.getpid(),
+                       'items_per_second': round(record['items'] / wall, 1) if record['items'] and wall > 0
+                       else None})
+        with _lock:
+            _records.append(record)
+
+
+def run_stage(name, run, cprofile_dir=None):
+    """Runs a pipeline stage with profiling enabled, possibly in a worker process, and returns its records so they can
+    be added to the report of the main process
+    Args:
+        name: obj:`String` Name of the stage
+        run: obj:`Callable` Function that runs the stage
+        cprofile_dir: obj:`String` Directory where a cProfile dump of the stage is saved, None to skip the dump
+    Returns:
+        obj:`List[Dict]` Records of the stage and the steps it ran
+    """
+    enable()
+    profiler = cProfile.Profile() if cprofile_dir else None
+    with step(name) as record:
+        record['stage'] = True
+        if profiler is not None:
+            profiler.enable()
+        try:
+            run()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(cprofile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(cprofile_dir, name + '.prof'))
+    return collect()
+
+
+def write_report(filepath, records, **metadata):
+    """Saves the profiling records as a json report. When a report from an earlier run exists at the same location,
+    stages that became noticeably slower are logged as warnings.
+    Args:
+        filepath: obj:`String` Filepath to the json report, usually next to auc.txt
+        records: obj:`List[Dict]` Records returned by `run_stage`
+        **metadata: Extra fields saved at the top of the report
+    Returns:
+        None
+    """
+    try:
+        with open(filepath) as f:
+            previous = {record['name']: record for record in json.load(f)['steps']
+                        if record.get('stage') and not record.get('skipped')}
+    except (OSError, ValueError, KeyError):
+        previous = {}
+
+    for record in records:
+        before = previous.get(record['name'])
+        if record.get('stage') and not record.get('skipped') and before and \
+                record['wall_seconds'] > 1.25 * before['wall_seconds'] + 1:
+            logger.warning("Stage %s took %.1f seconds compared to %.1f seconds in the previous run", record['name'],
+                           record['wall_seconds'], before['wall_seconds'])
+
+    report = dict(metadata, created=time.strftime('%Y-%m-%dT%H:%M:%S'), steps=records)
+    try:
+        with open(filepath, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info("Profiling report was saved to %s", filepath)
+
+    except OSError:
+        logger.error("Could not write the profiling report to %s", filepath)
+        sys.exit(3)
+
+
+def _stack():
+    """Returns the steps that are running in the current thread"""
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _fold_peak_rss(stack):
+    """Adds the current peak resident memory to the peak of every running step, before the peak is reset"""
+    peak_kb = _peak_rss_kb()
+    for record in stack:
+        record['peak_kb'] = max(record['peak_kb'], peak_kb)
+
+
+def _reset_peak_rss():
+    """Resets the peak resident memory of the process on Linux, elsewhere the peak covers the life of the process"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss_kb():
+    """Returns the peak resident memory of the process in kilobytes"""
+    try:
+        with open('/proc/self/status') as f:
+            return int(re.search(r'VmHWM:\s+(\d+)', f.read()).group(1))
+    except (OSError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == 'darwin' else peak
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StageCache:
+    """Record of the inputs and configuration each pipeline stage last ran with, used to skip unchanged stages.
+
+    A stage fingerprint is a hash of the stage name, its configuration and the content of its input files. File hashes
+    are remembered together with the size and modification time of the file so unchanged files are not read again.
+    """
+
+    def __init__(self, manifest_filepath):
+        """
+        Args:
+            manifest_filepath: obj:`String` Filepath to the json file where the fingerprints are stored
+        """
+        self.manifest_filepath = manifest_filepath
+        self.lock = threading.Lock()
+        try:
+            with open(manifest_filepath) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.manifest.setdefault('stages', {})
+        self.manifest.setdefault('files', {})
+
+    def file_hash(self, filepath):
+        """Returns the sha256 hash of the content of a file, or None if the file does not exist
+        Args:
+            filepath: obj:`String` Filepath to the file
+        Returns:
+            obj:`String` Hex digest of the file content
+        """
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return None
+
+        with self.lock:
+            known = self.manifest['files'].get(filepath)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(1048576), b''):
+                digest.update(block)
+        with self.lock:
+            self.manifest['files'][filepath] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                                'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+    def fingerprint(self, stage, inputs, params):
+        """Hashes everything a stage depends on
+        Args:
+            stage: obj:`String` Name of the stage
+            inputs: obj:`List[String]` Filepaths to the files read by the stage
+            params: obj:`Dict` Configuration used by the stage, or None when something the stage depends on could not
+                be checked, such as the version of a file on S3
+        Returns:
+            obj:`String` Hex digest identifying the inputs and configuration, or None if `params` is None. A stage
+                without a fingerprint is never fresh
+        """
+        if params is None:
+            return None
+        digest = hashlib.sha256(stage.encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        for filepath in inputs:
+            digest.update(filepath.encode())
+            digest.update(str(self.file_hash(filepath)).encode())
+        return digest.hexdigest()
+
+    def is_fresh(self, stage, fingerprint, outputs):
+        """Checks whether a stage last ran with the same fingerprint and its outputs still exist
+        Args:
+            stage: obj:`String` Name of the stage
+            fingerprint: obj:`String` Fingerprint created by `fingerprint`
+            outputs: obj:`List[String]` Filepaths to the files written by the stage
+        Returns:
+            obj:`Boolean` True if the stage can be skipped
+        """
+        if fingerprint is None:
+            return False
+        with self.lock:
+            recorded = self.manifest['stages'].get(stage)
+        return recorded == fingerprint and all(os.path.exists(filepath) for filepath in outputs)
+
+    def record(self, stage, fingerprint):
+        """Saves the fingerprint a stage ran with to the manifest file. A None fingerprint forgets the stage, so it
+        runs again next time
+        Args:
+            stage: obj:`String` Name of the stage
+            fingerprint: obj:`String` Fingerprint created by `fingerprint`
+        Returns:
+            None
+        """
+        with self.lock:
+            if fingerprint is None:
+                self.manifest['stages'].pop(stage, None)
+            else:
+                self.manifest['stages'][stage] = fingerprint
+            temp_filepath = self.manifest_filepath + '.tmp'
+            with open(temp_filepath, 'w') as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(temp_filepath, self.manifest_filepath)
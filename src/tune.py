@@ -0,0 +1,213 @@
+import concurrent.futures
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from lightfm import LightFM
+from lightfm.evaluation import auc_score
+from scipy import sparse
+
+from src.model import split_interactions
+
+logger = logging.getLogger(__name__)
+
+# The training and test interactions are written once as raw arrays and memory-mapped by every worker, so the trials
+# share one copy of the matrix through the page cache instead of each worker unpickling its own. The training set is
+# sorted by row, so its COO form (used to fit) and its CSR form (used to exclude known games from the AUC) share the
+# column and data arrays and only add the row and indptr arrays
+SHARED_ARRAYS = {'train': ['indptr', 'indices', 'data', 'row'], 'test': ['indptr', 'indices', 'data']}
+
+# Interactions of the worker process, loaded by `_init_worker`
+_shared = {}
+
+# Hyperparameters are named as in `run_model`, these names used by LightFM are accepted as well
+ALIASES = {'no_components': 'n_components', 'epochs': 'epoch'}
+
+# Hyperparameters that take the value of `run_model` when they are not part of the search space
+RUN_MODEL_DEFAULTS = ['n_components', 'loss', 'epoch']
+
+
+def search_space(space, method, n_trials, random_state):
+    """
+    Lists the hyperparameters of every trial of a search
+    Args:
+        space: obj:`Dict[String, List]` Values to try for every hyperparameter. With random search, a hyperparameter
+            can also be a range such as {'min': 0.01, 'max': 0.1, 'log': True}, integers are drawn when both ends are
+            integers
+        method: obj:`String` 'grid' to try every combination of values or 'random' to draw `n_trials` combinations
+        n_trials: obj:`int` Number of trials of a random search
+        random_state: obj:`int` Random state to seed the random search
+    Returns:
+        obj:`List[Dict]` Hyperparameters of every trial
+    """
+    names = list(space)
+    if method == 'grid':
+        if any(isinstance(space[name], dict) for name in names):
+            logger.error("Grid search needs a list of values for every hyperparameter")
+            raise ValueError("Provided argument `space` contains a range, which only random search can use")
+        return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+    if method == 'random':
+        rng = np.random.RandomState(random_state)
+        return [{name: _sample(space[name], rng) for name in names} for _ in range(n_trials)]
+
+    logger.error("%s is not a search method, use grid or random", method)
+    raise ValueError("Provided argument `method` is not grid or random")
+
+
+def canonical_space(space):
+    """
+    Renames the hyperparameters of a search space that use a name in `ALIASES` to the name used by `run_model`
+    Args:
+        space: obj:`Dict[String, List]` Values to try for every hyperparameter
+    Returns:
+        obj:`Dict[String, List]` The search space with every hyperparameter named as in `run_model`
+    """
+    canonical = {}
+    for name, values in space.items():
+        key = ALIASES.get(name, name)
+        if key in canonical:
+            logger.error("%s and %s name the same hyperparameter, use only %s", name, key, key)
+            raise ValueError("Provided argument `space` sets the hyperparameter %s twice" % key)
+        canonical[key] = values
+    return canonical
+
+
+def _sample(values, rng):
+    """Draws one value of a hyperparameter for random search"""
+    if not isinstance(values, dict):
+        return values[rng.randint(len(values))]
+
+    low, high = values['min'], values['max']
+    if values.get('log'):
+        value = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+    else:
+        value = float(rng.uniform(low, high))
+    return int(round(value)) if isinstance(low, int) and isinstance(high, int) else value
+
+
+def _share(directory, name, matrix):
+    """Writes the arrays of a CSR matrix to `directory` so they can be memory-mapped by `_init_worker`"""
+    arrays = {'indptr': matrix.indptr, 'indices': matrix.indices, 'data': matrix.data.astype(np.float32)}
+    if 'row' in SHARED_ARRAYS[name]:
+        arrays['row'] = np.repeat(np.arange(matrix.shape[0], dtype=matrix.indices.dtype), np.diff(matrix.indptr))
+    for array in SHARED_ARRAYS[name]:
+        np.save(os.path.join(directory, '%s_%s.npy' % (name, array)), arrays[array])
+
+
+def _init_worker(directory, shape):
+    """Memory-maps the shared interactions in a worker process. The arrays are mapped copy-on-write because LightFM
+    needs writable buffers, but nothing writes to them so every worker reads the same pages"""
+    arrays = {'%s_%s' % (name, array): np.load(os.path.join(directory, '%s_%s.npy' % (name, array)), mmap_mode='c')
+              for name, names in SHARED_ARRAYS.items() for array in names}
+    _shared['train_coo'] = sparse.coo_matrix((arrays['train_data'], (arrays['train_row'], arrays['train_indices'])),
+                                             shape=shape)
+    for name in SHARED_ARRAYS:
+        _shared[name] = sparse.csr_matrix((arrays[name + '_data'], arrays[name + '_indices'],
+                                           arrays[name + '_indptr']), shape=shape)
+
+
+def _run_trial(trial, params, defaults, n_jobs, random_state):
+    """Trains a model with the hyperparameters of one trial on the shared training set and scores it on the test set.
+    `n_components` and `epoch` are named as in `run_model`, every other hyperparameter is passed to LightFM. The
+    hyperparameters missing from the trial take their value from `defaults`"""
+    settings = dict(defaults, **params)
+    epoch = settings.pop('epoch')
+    model = LightFM(no_components=settings.pop('n_components'), random_state=random_state, **settings)
+
+    start = time.perf_counter()
+    model.fit(_shared['train_coo'], epochs=epoch, num_threads=n_jobs)
+    fit_seconds = time.perf_counter() - start
+    # The split never puts an interaction in both sets, so the costly intersection check is skipped
+    test_auc = auc_score(model, _shared['test'], train_interactions=_shared['train'], num_threads=n_jobs,
+                         check_intersections=False).mean()
+    return dict(trial=trial, **params, test_auc=float(test_auc), fit_seconds=round(fit_seconds, 3),
+                seconds=round(time.perf_counter() - start, 3))
+
+
+def write_leaderboard(filepath, results):
+    """
+    Saves the finished trials to a csv file, best test AUC first
+    Args:
+        filepath: obj:`String` Filepath to where the leaderboard is saved to
+        results: obj:`List[Dict]` Hyperparameters and scores of every finished trial
+    Returns:
+        leaderboard: obj:`pandas DataFrame` The saved leaderboard
+    """
+    leaderboard = pd.DataFrame(results).sort_values(['test_auc', 'trial'], ascending=[False, True])
+    leaderboard.insert(0, 'rank', range(1, len(leaderboard) + 1))
+    leaderboard.to_csv(filepath, index=False)
+    return leaderboard
+
+
+def tune(interactions_filepath, run_model, space, method, n_trials, train_size, random_state, n_jobs, max_workers,
+         scratch_dir, leaderboard):
+    """
+    Searches the hyperparameters of the LightFM model. The interactions are split once into a training and test
+    set that every trial shares, and the trials run in a pool of processes. The leaderboard is rewritten every time a
+    trial finishes, so the results of a long search can be followed while it runs.
+    Args:
+        interactions_filepath: obj:`String` Filepath to the interaction matrix saved by the interactions stage
+        run_model: obj:`Dict` Settings of the `run_model` step, which give the number of components, loss and number
+            of epochs of the trials when the search space does not include them
+        space: obj:`Dict[String, List]` Values to try for every hyperparameter, see `search_space`. `n_components` and
+            `epoch` can also be named `no_components` and `epochs` as in LightFM
+        method: obj:`String` 'grid' or 'random'
+        n_trials: obj:`int` Number of trials of a random search
+        train_size: obj:`float` Percentage of interactions to be in the training set
+        random_state: obj:`int` Random state to seed the split, the search and the models
+        n_jobs: obj:`int` number of cores used by each trial
+        max_workers: obj:`int` Number of trials run at the same time, or None for one per core
+        scratch_dir: obj:`String` Directory where the shared arrays are stored while the search runs. Defaults to the
+            system temporary directory
+        leaderboard: obj:`String` Filepath to where the leaderboard csv is saved to
+    Returns:
+        obj:`pandas DataFrame` Hyperparameters and test AUC of every trial, best first
+    """
+    try:
+        interactions = sparse.load_npz(interactions_filepath).tocsr()
+
+    except FileNotFoundError:
+        logger.error("Could not find file %s, please run the interactions stage first", interactions_filepath)
+        sys.exit(3)
+
+    space = canonical_space(space)
+    defaults = {key: run_model[key] for key in RUN_MODEL_DEFAULTS if key not in space}
+    if defaults:
+        logger.info("Using the run_model settings %s for the hyperparameters missing from the search space", defaults)
+    trials = search_space(space, method, n_trials, random_state)
+    if not trials:
+        logger.warning("The search space does not contain any trials")
+        return pd.DataFrame()
+    max_workers = max_workers or os.cpu_count()
+    logger.info("Running %d trials of a %s search in %d processes with %d threads each", len(trials), method,
+                max_workers, n_jobs)
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as tmp_dir:
+        train, test = split_interactions(interactions, train_size, random_state)
+        shape = interactions.shape
+        _share(tmp_dir, 'train', train)
+        _share(tmp_dir, 'test', test)
+        del interactions, train, test
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                    initargs=(tmp_dir, shape)) as executor:
+            futures = {executor.submit(_run_trial, trial, params, defaults, n_jobs, random_state): trial
+                       for trial, params in enumerate(trials)}
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results.append(result)
+                logger.info("Trial %d/%d %s: test AUC %.4f in %.1f seconds", len(results), len(trials),
+                            {key: result[key] for key in space}, result['test_auc'], result['seconds'])
+                board = write_leaderboard(leaderboard, results)
+
+    best = board.iloc[0]
+    logger.info("Best test AUC of %.4f with %s, leaderboard saved to %s", best['test_auc'],
+                {key: best[key] for key in space}, leaderboard)
+    return board
@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+
+from src.create_db import create_db, Games, GameManager
+
+
+def test_add_games():
+    engine_string = 'sqlite:///tests/outputs/test_add_games.db'
+    if os.path.exists('tests/outputs/test_add_games.db'):
+        os.remove('tests/outputs/test_add_games.db')
+    create_db(engine_string, True)
+    df_in = pd.DataFrame([[10, 'game1', 'action', '2013', 'google.com'],
+                          [20, 'game2', ' ', '2013', 'google.com'],
+                          [30, 'game3', 'action', ' ', 'google.com']],
+                         columns=['id', 'app_name', 'genres', 'release_date', 'url'])
+
+    gm = GameManager(engine_string=engine_string)
+    added = gm.add_games(df_in, 'id', 'app_name', 'genres', 'release_date', 'url', 2)
+    games = gm.session.query(Games).order_by(Games.game_id).all()
+    gm.close()
+
+    assert added == 3
+    assert [(game.game_id, game.title, game.genre) for game in games] == [(10, 'game1', 'action'), (20, 'game2', ' '),
+                                                                          (30, 'game3', 'action')]
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from src.artifacts import count_rows, iter_frame_chunks, read_frame, write_frame
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'npz', 'csv'])
+def test_write_read_frame(extension):
+    df_in = pd.DataFrame({'uid': [0, 0, 1, 2, 2], 'id': [10, 20, 10, 15, 20], 'owned': [1.0] * 5})
+    filepath = 'tests/outputs/frame.' + extension
+    write_frame(df_in, filepath, {'uid': 'int32', 'id': 'int32', 'owned': 'uint8'})
+    df_out = read_frame(filepath, ['id', 'owned'])
+
+    assert df_out.columns.tolist() == ['id', 'owned']
+    assert df_out.values.tolist() == df_in[['id', 'owned']].values.tolist()
+    if extension != 'csv':
+        assert df_out.dtypes.tolist() == ['int32', 'uint8']
+
+    chunks = list(iter_frame_chunks(filepath, ['uid', 'id'], 2, {'uid': 'int32', 'id': 'int32'}))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert pd.concat(chunks).values.tolist() == df_in[['uid', 'id']].values.tolist()
+    assert chunks[0].dtypes.tolist() == ['int32', 'int32']
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'npz', 'csv'])
+def test_count_rows(extension):
+    df_in = pd.DataFrame({'uid': range(7), 'id': range(7)})
+    filepath = 'tests/outputs/frame.' + extension
+    write_frame(df_in, filepath)
+
+    assert count_rows(filepath) == 7
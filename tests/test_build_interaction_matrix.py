@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from src.process_data import build_interaction_matrix
+
+
+def test_build_interaction_matrix():
+    df_in = pd.DataFrame([[2, 15, 1.0], [0, 10, 1.0], [0, 20, 1.0],
+                          [1, 10, 1.0], [1, 20, 1.0], [2, 10, 1.0]],
+                         columns=['uid', 'id', 'owned'])
+
+    row = np.array([0, 0, 1, 1, 2, 2])
+    column = np.array([0, 2, 0, 2, 0, 1])
+    data = np.array([1, 1, 1, 1, 1, 1])
+    test_matrix = sparse.csr_matrix((data, (row, column)), shape=(3, 3))
+    sparse_out, users_out, items_out = build_interaction_matrix(df_in, 'uid', 'id', 'owned')
+
+    assert (sparse_out.todense() == test_matrix.todense()).all()
+    assert users_out.tolist() == [0, 1, 2]
+    assert items_out.tolist() == [10, 15, 20]
+
+
+def test_build_interaction_matrix_type():
+    df_in = 'test'
+    with pytest.raises(TypeError):
+        build_interaction_matrix(df_in, 'uid', 'id', 'owned')
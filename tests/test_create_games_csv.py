@@ -26,4 +26,11 @@ def test_create_games_csv():
 def test_create_games_csv_type():
     df_in = 'test'
     with pytest.raises(TypeError):
-        create_games_csv(df_in, ['id', 'app_name', 'genres', 'release_date', 'url'], 'id')
\ No newline at end of file
+        create_games_csv(df_in, ['id', 'app_name', 'genres', 'release_date', 'url'], 'id')
+
+
+def test_create_games_csv_lists():
+    df_in = pd.DataFrame([[10, 'game1', ['Action', 'RPG']], [20, 'game2', None]], columns=['id', 'app_name', 'genres'])
+    df_out = create_games_csv(df_in, ['id', 'app_name', 'genres'], 'id')
+
+    assert df_out['genres'].tolist() == ["['Action', 'RPG']", '']
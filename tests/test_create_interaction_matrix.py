@@ -16,7 +16,7 @@ def test_create_interaction_matrix():
     column = np.array([0, 2, 0, 2, 0, 1])
     data = np.array([1, 1, 1, 1, 1, 1])
     test_matrix = sparse.csr_matrix((data, (row, column)), shape=(3, 3))
-    sparse_out = create_interaction_matrix(df_in, 'uid', 'id', 'owned', 2, 'tests/outputs/item_names.txt')
+    sparse_out = create_interaction_matrix(df_in, 'uid', 'id', 'owned', 'tests/outputs/item_names.txt')
     booleans = sparse_out.todense() == test_matrix.todense()
     assert booleans.all()
 
@@ -24,4 +24,4 @@ def test_create_interaction_matrix():
 def test_create_interaction_matrix_type():
     df_in = 'test'
     with pytest.raises(TypeError):
-        sparse_out = create_interaction_matrix(df_in, 'uid', 'id', 'owned', 2, 'tests/outputs/item_names.txt')
+        sparse_out = create_interaction_matrix(df_in, 'uid', 'id', 'owned', 'tests/outputs/item_names.txt')
@@ -12,7 +12,8 @@ def test_create_user_games_csv():
                         [40, 'game4', 'action', '2013', '']],
                        columns=['id', 'app_name', 'genres', 'release_date', 'url'])
     df_out = create_user_games_csv(df_in, df2, 'items', 'uid', 'id', 'owned', 'app_name', 'item_id')
-    df_test = pd.DataFrame([[0, 10, 1.0], [0, 20, 1.0]], columns=['uid', 'id', 'owned'])
+    df_test = pd.DataFrame([[0, 10, 1], [0, 20, 1]], columns=['uid', 'id', 'owned'])
+    df_test = df_test.astype({'uid': 'int32', 'id': 'int32', 'owned': 'uint8'})
 
     assert df_test.equals(df_out)
 
@@ -25,4 +26,12 @@ def test_create_user_games_csv_type():
                         [40, 'game4', 'action', '2013', '']],
                        columns=['id', 'app_name', 'genres', 'release_date', 'url'])
     with pytest.raises(TypeError):
-        df_in = create_user_games_csv(df_in, df2, 'items', 'uid', 'id', 'owned', 'app_name', 'item_id')
\ No newline at end of file
+        df_in = create_user_games_csv(df_in, df2, 'items', 'uid', 'id', 'owned', 'app_name', 'item_id')
+
+
+def test_create_user_games_csv_unknown_games():
+    df_in = pd.DataFrame([[[{"item_id": "10"}, {"item_id": "99"}]], [[]], [[{"item_id": "30"}]]], columns=['items'])
+    df2 = pd.DataFrame([[10, 'game1'], [20, 'game2'], [30, 'game3']], columns=['id', 'app_name'])
+    df_out = create_user_games_csv(df_in, df2, 'items', 'uid', 'id', 'owned', 'app_name', 'item_id')
+
+    assert df_out.values.tolist() == [[0, 10, 1], [2, 30, 1]]
@@ -0,0 +1,61 @@
+import gzip
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+from src.get_data import download
+
+RECORDS = [{'id': str(i), 'app_name': 'game%d' % i, 'tags': ['Action']} for i in range(200)]
+GZIP_BYTES = gzip.compress(''.join(repr(record) + '\n' for record in RECORDS).encode())
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Local stand-in for the data server that supports HTTP Range requests"""
+    ranges = []
+
+    def do_GET(self):
+        header = self.headers.get('Range')
+        RangeHandler.ranges.append(header)
+        start = int(header[len('bytes='):-1]) if header else 0
+        self.send_response(206 if header else 200)
+        self.send_header('Content-Length', str(len(GZIP_BYTES) - start))
+        self.end_headers()
+        self.wfile.write(GZIP_BYTES[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = http.server.HTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    RangeHandler.ranges = []
+    yield 'http://127.0.0.1:%d/steam_games.json.gz' % server.server_port
+    server.shutdown()
+
+
+def _read_json_lines(filepath):
+    with open(filepath) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_download(url):
+    download(url, 'tests/outputs/download.json.gz', 'tests/outputs/download.json', 64)
+
+    assert RangeHandler.ranges == [None]
+    assert _read_json_lines('tests/outputs/download.json') == RECORDS
+
+
+def test_download_resume(url):
+    with open('tests/outputs/resume.json.gz.part', 'wb') as f:
+        f.write(GZIP_BYTES[:100])
+    download(url, 'tests/outputs/resume.json.gz', 'tests/outputs/resume.json', 64)
+
+    assert RangeHandler.ranges == ['bytes=100-']
+    assert not os.path.exists('tests/outputs/resume.json.gz.part')
+    assert _read_json_lines('tests/outputs/resume.json') == RECORDS
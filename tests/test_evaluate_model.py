@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from src.model import evaluate_model
+
+
+def test_evaluate_model():
+    rng = np.random.RandomState(0)
+    interactions = sparse.csr_matrix((rng.rand(50, 20) < 0.3).astype(np.float32))
+    auc_out, epochs_out = evaluate_model(interactions, 0.8, 5, 'warp', 2, 1, 24)
+
+    assert 0 <= auc_out <= 1
+    assert epochs_out == 2
+
+
+def test_evaluate_model_early_stopping():
+    rng = np.random.RandomState(0)
+    interactions = sparse.csr_matrix((rng.rand(100, 30) < 0.3).astype(np.float32))
+    early_stopping = {'enabled': True, 'validation_size': 0.2, 'validation_users': 50, 'eval_every': 2,
+                      'patience': 2, 'min_delta': 0.0}
+    auc_out, epochs_out = evaluate_model(interactions, 0.8, 5, 'warp', 10, 1, 24, early_stopping)
+
+    assert 0 <= auc_out <= 1
+    assert 2 <= epochs_out <= 10
+    assert epochs_out % 2 == 0
+
+
+def test_evaluate_model_type():
+    interactions = 'test'
+    with pytest.raises(TypeError):
+        evaluate_model(interactions, 0.8, 5, 'warp', 2, 1, 24)
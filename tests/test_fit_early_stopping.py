@@ -0,0 +1,32 @@
+import numpy as np
+from lightfm.evaluation import auc_score
+from scipy import sparse
+
+from src.model import fit_early_stopping
+
+
+def test_fit_early_stopping():
+    rng = np.random.RandomState(0)
+    interactions = (rng.rand(80, 30) < 0.3).astype(np.float32)
+    train = sparse.csr_matrix(interactions * (rng.rand(80, 30) < 0.8))
+    validation = sparse.csr_matrix(interactions) - train
+    model, best_epoch, history = fit_early_stopping(train, validation, 5, 'warp', 12, 1, 24, eval_every=3, patience=2,
+                                                    min_delta=0.0)
+
+    assert [epoch for epoch, _ in history] == [3, 6, 9, 12][:len(history)]
+    assert best_epoch == max(history, key=lambda record: record[1])[0]
+    # The returned model is the checkpoint of the best epoch, not the last one
+    best_auc = auc_score(model, validation, train_interactions=train).mean()
+    assert np.isclose(best_auc, dict(history)[best_epoch])
+
+
+def test_fit_early_stopping_patience():
+    rng = np.random.RandomState(0)
+    interactions = (rng.rand(40, 20) < 0.3).astype(np.float32)
+    train = sparse.csr_matrix(interactions * (rng.rand(40, 20) < 0.8))
+    validation = sparse.csr_matrix(interactions) - train
+    _, _, history = fit_early_stopping(train, validation, 5, 'warp', 50, 1, 24, eval_every=1, patience=1,
+                                       min_delta=1.0)
+
+    # No evaluation can improve on the first one by a whole AUC point, so training stops after the second
+    assert len(history) == 2
@@ -0,0 +1,21 @@
+import pytest
+
+from src.name_index import GameNameIndex
+
+
+def test_game_name_index_lookup():
+    index = GameNameIndex(['Portal 2', 'Half-Life', 'Portal', ''], [620, 70, 400, 10])
+
+    assert index.lookup('portal  2') == 620
+    assert index.lookup(' HALF-LIFE') == 70
+    with pytest.raises(KeyError):
+        index.lookup('Portal 3')
+
+
+def test_game_name_index_complete():
+    index = GameNameIndex(['Portal 2', 'Half-Life', 'Portal', 'Portal Stories'], [620, 70, 400, 300])
+
+    assert index.complete('port', 10) == [('Portal', 400), ('Portal 2', 620), ('Portal Stories', 300)]
+    assert index.complete('PORTAL ', 2) == [('Portal', 400), ('Portal 2', 620)]
+    assert index.complete('zelda', 10) == []
+    assert index.complete('', 10) == []
@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+import sqlalchemy
+
+from src.create_db import create_db, Games, GameManager
+
+
+def _create_games_db(filename):
+    if os.path.exists('tests/outputs/' + filename):
+        os.remove('tests/outputs/' + filename)
+    engine_string = 'sqlite:///tests/outputs/' + filename
+    create_db(engine_string, True)
+    df_in = pd.DataFrame([[10, 'game1', 'action', '2013', 'google.com'],
+                          [20, 'game2', ' ', '2013', 'google.com'],
+                          [30, 'game3', 'action', ' ', 'google.com']],
+                         columns=['id', 'app_name', 'genres', 'release_date', 'url'])
+    gm = GameManager(engine_string=engine_string)
+    gm.add_games(df_in, 'id', 'app_name', 'genres', 'release_date', 'url', 10)
+    gm.close()
+    return engine_string
+
+
+def test_get_games():
+    engine_string = _create_games_db('test_get_games.db')
+    gm = GameManager(engine_string=engine_string, cache_size=2)
+
+    assert [game.title for game in gm.get_games([30, 40, 10])] == ['game3', 'game1']
+    gm.session.query(Games).delete()
+    gm.session.commit()
+    assert [game.title for game in gm.get_games(['10', 30])] == ['game1', 'game3']
+    assert gm.get_games([20]) == []
+    gm.close()
+
+
+def test_create_db_adds_missing_index():
+    engine_string = 'sqlite:///tests/outputs/test_migrate.db'
+    if os.path.exists('tests/outputs/test_migrate.db'):
+        os.remove('tests/outputs/test_migrate.db')
+    engine = sqlalchemy.create_engine(engine_string)
+    engine.execute("CREATE TABLE Games (id INTEGER PRIMARY KEY, game_id INTEGER, title VARCHAR(100), "
+                   "genre VARCHAR(100), release_date VARCHAR(100), url VARCHAR(100))")
+    create_db(engine_string, False)
+    indexes = sqlalchemy.inspect(engine).get_indexes('Games')
+
+    assert [index['column_names'] for index in indexes] == [['game_id']]
@@ -0,0 +1,30 @@
+import json
+
+from src.process_data import accumulate_user_items, json_generator
+
+RECORDS = [{'user_id': 'user%d' % i, 'items_count': 2,
+            'items': [{'item_id': str(i), 'item_name': 'game [%d], {x}' % i}, {'item_id': '10', 'item_name': '"q"'}]}
+           for i in range(50)]
+
+
+def test_json_generator_array():
+    with open('tests/outputs/records.json', 'w') as f:
+        json.dump(RECORDS, f, indent=1)
+
+    assert list(json_generator('tests/outputs/records.json', read_size=16)) == RECORDS
+
+
+def test_json_generator_lines():
+    with open('tests/outputs/records.jsonl', 'w') as f:
+        f.writelines(json.dumps(record) + '\n' for record in RECORDS)
+
+    assert list(json_generator('tests/outputs/records.jsonl')) == RECORDS
+
+
+def test_accumulate_user_items():
+    records = [{'user_id': 'empty', 'items': []}] + RECORDS[:2] + [RECORDS[0]]
+    user_ids_out, pairs_out = accumulate_user_items(records, 'user_id', 'items', 'item_id', 'uid', 'id')
+
+    assert user_ids_out == ['empty', 'user0', 'user1']
+    assert pairs_out.values.tolist() == [[1, 0], [1, 10], [2, 1], [2, 10]]
+    assert pairs_out.dtypes.tolist() == ['int32', 'int32']
@@ -0,0 +1,30 @@
+import os
+
+from benchmarks.load_test import local_download_s3, summarize, _parse_server_timing
+
+
+def test_summarize():
+    results = [{'kind': 'game_id', 'latency_ms': float(latency), 'status': 200,
+                'timings': _parse_server_timing('lookup;dur=0.5, db;dur=2.000, render;dur=1.5')}
+               for latency in range(1, 101)]
+    results.append({'kind': 'index', 'latency_ms': 200.0, 'status': 'error page', 'timings': {}})
+    summary = summarize(results, 2.0)
+
+    assert summary['requests'] == 101
+    assert summary['errors'] == 1
+    assert summary['throughput_rps'] == 50.5
+    assert summary['by_kind']['game_id']['p50_ms'] == 50.5
+    assert summary['by_kind']['game_id']['p99_ms'] == 99.01
+    assert summary['by_kind']['game_id']['breakdown_ms'] == {'lookup': 0.5, 'db': 2.0, 'render': 1.5}
+    assert summary['by_kind']['index']['breakdown_ms']['db'] == 0
+
+
+def test_local_download_s3():
+    os.makedirs('tests/outputs/bucket/test-bucket/results', exist_ok=True)
+    with open('tests/outputs/bucket/test-bucket/results/neighbors.bin', 'wb') as f:
+        f.write(b'neighbors')
+
+    download_s3 = local_download_s3('tests/outputs/bucket')
+    download_s3('tests/outputs/neighbors_copy.bin', 'test-bucket', 'results/neighbors.bin')
+    with open('tests/outputs/neighbors_copy.bin', 'rb') as f:
+        assert f.read() == b'neighbors'
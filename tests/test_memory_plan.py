@@ -0,0 +1,38 @@
+import pytest
+
+from src.memory_plan import check_model_memory, parse_memory_budget, plan_block_size, plan_interactions
+
+
+def test_parse_memory_budget():
+    assert parse_memory_budget(None) is None
+    assert parse_memory_budget(1024) == 1024
+    assert parse_memory_budget('8GB') == 8 * 2 ** 30
+    assert parse_memory_budget('512 mb') == 512 * 2 ** 20
+    assert parse_memory_budget('1.5G') == int(1.5 * 2 ** 30)
+    auto = parse_memory_budget('auto')
+    assert auto is None or auto > 0
+    with pytest.raises(ValueError):
+        parse_memory_budget('lots')
+
+
+def test_plan_interactions():
+    assert plan_interactions(1000, 2 ** 30) == (False, 10000)
+
+    stream, chunk_size = plan_interactions(10 ** 8, 5 * 2 ** 30)
+    assert stream
+    assert 10000 <= chunk_size <= 10 ** 8
+
+    # The chunks never get smaller than the minimum, even when the matrix is over the budget
+    assert plan_interactions(10 ** 8, 2 ** 20) == (True, 10000)
+
+
+def test_plan_block_size():
+    assert plan_block_size(1000, 30, 2 ** 30, 1024) == 1000
+    assert plan_block_size(100000, 30, 4 * 2 ** 30, 1024) == 1024
+    assert 1 <= plan_block_size(100000, 30, 100 * 2 ** 20, 1024) < 1024
+    assert plan_block_size(100000, 30, 2 ** 20, 1024) == 1
+
+
+def test_check_model_memory():
+    assert check_model_memory(1000, 100, 10000, 30, 2 ** 30)
+    assert not check_model_memory(10 ** 7, 10 ** 5, 10 ** 8, 30, 2 ** 30, evaluation=True)
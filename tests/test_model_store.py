@@ -0,0 +1,24 @@
+import numpy as np
+from lightfm import LightFM
+from scipy import sparse
+
+from src.model_store import MODEL_ARRAYS, load_model, save_model
+
+
+def test_save_load_model():
+    rng = np.random.RandomState(0)
+    interactions = sparse.csr_matrix((rng.rand(20, 10) < 0.3).astype(np.float32))
+    model = LightFM(no_components=4, loss='warp', random_state=24)
+    model.fit(interactions, epochs=2)
+    save_model(model, 'tests/outputs/model', np.arange(100, 120), list(range(10)), interactions)
+
+    model_out, user_ids_out, item_ids_out, interactions_out = load_model('tests/outputs/model', 24)
+
+    assert model_out.no_components == 4
+    assert model_out.loss == 'warp'
+    assert user_ids_out.tolist() == list(range(100, 120))
+    assert item_ids_out.tolist() == list(range(10))
+    assert (interactions_out != interactions).nnz == 0
+    for name in MODEL_ARRAYS:
+        assert np.array_equal(getattr(model_out, name), getattr(model, name))
+    assert np.allclose(model_out.predict(0, np.arange(10)), model.predict(0, np.arange(10)))
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.neighbors import NeighborIndex, write_neighbors
+
+
+def test_neighbor_index_lookup():
+    index = NeighborIndex(np.array([10, 20, 30]), np.array([[20, 30], [10, 30], [10, 20]]))
+
+    assert index.lookup('20', 2) == [10, 30]
+    assert index.lookup(30, 1) == [10]
+
+
+def test_neighbor_index_load():
+    neighbors = np.array([[1, 2], [2, 0], [0, 1]])
+    scores = np.array([[.9, .1], [.5, .1], [.9, .5]], dtype=np.float32)
+    write_neighbors('tests/outputs/neighbors.bin', [30, 10, 20], neighbors, scores)
+    index = NeighborIndex.load('tests/outputs/neighbors.bin')
+
+    assert isinstance(index.neighbor_ids, np.memmap)
+    assert index.ids.tolist() == [10, 20, 30]
+    assert index.lookup(30, 2) == [10, 20]
+    assert index.lookup(10, 2) == [20, 30]
+    assert np.allclose(index.scores[0], [.5, .1])
+
+
+def test_neighbor_index_from_similarity_df():
+    similarities = pd.DataFrame([[30, -0.5, -0.9, 1.0], [10, 1.0, 0.4, -0.5], [20, 0.4, 1.0, -0.9]],
+                                columns=['id', '10', '20', '30'])
+    index = NeighborIndex.from_similarity_df(similarities, 'id', 2)
+
+    assert index.lookup(10, 2) == [20, 30]
+    assert index.lookup(30, 2) == [10, 20]
+
+
+def test_neighbor_index_missing_game():
+    index = NeighborIndex(np.array([10, 20]), np.array([[20], [10]]))
+    with pytest.raises(KeyError):
+        index.lookup(40, 1)
+    with pytest.raises(KeyError):
+        index.lookup(15, 1)
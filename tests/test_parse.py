@@ -0,0 +1,23 @@
+import gzip
+
+import pytest
+
+from src.get_data import parse
+
+
+def test_parse():
+    records = [{'user_id': str(i), 'items': [{'item_id': str(i * 10), 'playtime': 1.5}], 'ok': True}
+               for i in range(100)]
+    with gzip.open('tests/outputs/parse.json.gz', 'wt') as f:
+        f.writelines(repr(record) + '\n' for record in records)
+
+    assert list(parse('tests/outputs/parse.json.gz')) == records
+    assert list(parse('tests/outputs/parse.json.gz', n_jobs=2, batch_lines=7)) == records
+
+
+def test_parse_rejects_code():
+    with gzip.open('tests/outputs/parse_code.json.gz', 'wt') as f:
+        f.write("__import__('os').getcwd()\n")
+
+    with pytest.raises(ValueError):
+        list(parse('tests/outputs/parse_code.json.gz'))
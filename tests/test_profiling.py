@@ -0,0 +1,53 @@
+import json
+
+from src import profiling
+
+
+def test_step():
+    profiling.enable()
+    with profiling.step('outer'):
+        with profiling.step('inner', 100) as record:
+            data = list(range(100000))
+        with profiling.step('sized') as sized:
+            sized['items'] = len(data)
+    records = {record['name']: record for record in profiling.disable()}
+
+    assert record['parent'] == 'outer'
+    assert records['inner']['items'] == 100
+    assert records['inner']['items_per_second'] > 0
+    assert records['sized']['items'] == 100000
+    assert records['outer']['parent'] is None
+    assert records['outer']['wall_seconds'] >= records['inner']['wall_seconds']
+    assert records['outer']['peak_rss_mb'] >= records['inner']['peak_rss_mb'] > 0
+
+
+def test_step_parent_peak():
+    profiling.enable()
+    with profiling.step('outer'):
+        data = b'x' * (200 * 1024 * 1024)
+        del data
+        # The child resets the high-water mark, which must not lose the peak the parent reached before it started
+        with profiling.step('inner'):
+            pass
+    records = {record['name']: record for record in profiling.disable()}
+
+    assert records['outer']['peak_rss_mb'] >= records['inner']['peak_rss_mb'] + 150
+
+
+def test_step_disabled():
+    with profiling.step('ignored', 10):
+        pass
+
+    assert profiling.collect() == []
+
+
+def test_write_report():
+    records = profiling.run_stage('stage', lambda: None)
+    profiling.disable()
+    profiling.write_report('tests/outputs/profile.json', records, max_workers=1)
+    with open('tests/outputs/profile.json') as f:
+        report = json.load(f)
+
+    assert report['max_workers'] == 1
+    assert [record['name'] for record in report['steps']] == ['stage']
+    assert report['steps'][0]['stage']
@@ -0,0 +1,16 @@
+import json
+
+from src.process_data import read_games_json
+
+
+def test_read_games_json():
+    records = [{'id': '10', 'app_name': 'game1', 'reviews': ['long'] * 3, 'price': 4.99},
+               {'id': '10', 'app_name': 'game1 again'},
+               {'app_name': 'no id'},
+               {'id': '20', 'app_name': 'game2', 'tags': ['Action']}]
+    with open('tests/outputs/games.json', 'w') as f:
+        f.writelines(json.dumps(record) + '\n' for record in records)
+    df_out = read_games_json('tests/outputs/games.json', ['id', 'app_name', 'genres'], 'id')
+
+    assert df_out.columns.tolist() == ['id', 'app_name', 'genres']
+    assert df_out.values.tolist() == [['10', 'game1', None], ['20', 'game2', None]]
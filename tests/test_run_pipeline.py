@@ -0,0 +1,140 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+import yaml
+
+from src.create_db import games_table_state, Games
+from src.pipeline import pipeline_stages, run_pipeline
+from src.stage_cache import StageCache
+
+
+def test_run_pipeline():
+    with open('config/config.yaml') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    config['stage_cache']['manifest'] = 'tests/outputs/pipeline_cache.json'
+    config['model']['only']['user_games_path'] = 'tests/outputs/pipeline_users_games.csv'
+    config['model']['interactions']['game_id_txt_filepath'] = 'tests/outputs/pipeline_item_names.txt'
+    config['model']['interactions']['user_id_filepath'] = 'tests/outputs/pipeline_user_ids.npy'
+    config['model']['interactions']['user_lookup_filepath'] = 'tests/outputs/pipeline_users.csv'
+    config['model']['model_store']['directory'] = 'tests/outputs/pipeline_model'
+    config['model']['filepaths'].update({'interactions': 'tests/outputs/pipeline_interactions.npz',
+                                         'item_names': 'tests/outputs/pipeline_item_names.txt',
+                                         'item_embeddings': 'tests/outputs/pipeline_item_embeddings.npy',
+                                         'auc_txt': 'tests/outputs/pipeline_auc.txt',
+                                         'best_epoch': 'tests/outputs/pipeline_best_epoch.txt',
+                                         'user_ids': 'tests/outputs/pipeline_user_ids.npy'})
+    for stage in ('run_model', 'evaluate_model'):
+        config['model'][stage].update({'n_components': 4, 'epoch': 2})
+    for filepath in [config['stage_cache']['manifest'], config['model']['filepaths']['auc_txt'],
+                     config['model']['filepaths']['item_embeddings']]:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+    rng = np.random.RandomState(0)
+    pairs = np.argwhere(rng.rand(40, 15) < 0.3)
+    pd.DataFrame({'uid': pairs[:, 0], 'id': pairs[:, 1] + 100, 'owned': 1.0}).to_csv(
+        config['model']['only']['user_games_path'])
+    pd.DataFrame({'uid': range(40), 'user_id': ['7656119%d' % uid for uid in range(40)]}).to_csv(
+        config['model']['interactions']['user_lookup_filepath'], index=False)
+
+    run_pipeline(config, 'sqlite://', ['interactions', 'evaluate', 'train'], True, 2)
+
+    assert os.path.exists(config['model']['filepaths']['auc_txt'])
+    assert np.load(config['model']['filepaths']['item_embeddings']).shape == (15, 4)
+    assert np.load('tests/outputs/pipeline_model/item_embeddings.npy').shape == (15, 4)
+    assert np.load(config['model']['filepaths']['user_ids'])[0] == '76561190'
+
+
+def test_run_pipeline_reordered_users():
+    with open('config/config.yaml') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    games_config = config['process_data']['steam_game_data']
+    users_config = config['process_data']['steam_user_data']
+    model_config = config['model']
+    games_config['output'] = 'tests/outputs/reorder_games.parquet'
+    users_config.update({'input': 'tests/outputs/reorder_users.jsonl', 'parsed': 'tests/outputs/reorder_pairs.parquet',
+                         'users': 'tests/outputs/reorder_users.parquet',
+                         'output': 'tests/outputs/reorder_users_games.parquet'})
+    model_config['only']['user_games_path'] = users_config['output']
+    model_config['interactions'].update({'game_id_txt_filepath': 'tests/outputs/reorder_item_names.txt',
+                                         'user_id_filepath': 'tests/outputs/reorder_user_ids.npy',
+                                         'user_lookup_filepath': users_config['users']})
+    model_config['filepaths'].update({'interactions': 'tests/outputs/reorder_interactions.npz',
+                                      'item_names': 'tests/outputs/reorder_item_names.txt',
+                                      'item_embeddings': 'tests/outputs/reorder_item_embeddings.npy',
+                                      'user_ids': 'tests/outputs/reorder_user_ids.npy'})
+    model_config['model_store'].update({'directory': 'tests/outputs/reorder_model', 'incremental': True,
+                                        'incremental_epoch': 1})
+    model_config['run_model'].update({'n_components': 4, 'epoch': 2})
+    model_config['evaluate_model']['early_stopping']['enabled'] = False
+    if os.path.exists('tests/outputs/reorder_model/params.json'):
+        os.remove('tests/outputs/reorder_model/params.json')
+    pd.DataFrame({'id': np.arange(100, 110), 'app_name': ['game%d' % i for i in range(10)]}).to_parquet(
+        games_config['output'], index=False)
+    stages = ['parse_users', 'process_users', 'interactions', 'train']
+
+    rng = np.random.RandomState(0)
+    users = [{'user_id': str(76561197960265728 + i),
+              'items': [{'item_id': str(item)} for item in 100 + np.flatnonzero(rng.rand(10) < 0.4)]}
+             for i in range(30)]
+    with open(users_config['input'], 'w') as f:
+        f.writelines(json.dumps(user) + '\n' for user in users)
+    run_pipeline(config, 'sqlite://', stages, False)
+    user_ids = np.load('tests/outputs/reorder_model/user_ids.npy')
+    embeddings = dict(zip(user_ids, np.load('tests/outputs/reorder_model/user_embeddings.npy')))
+
+    # The refreshed dump lists the users in reverse, drops one and adds a new one, which moves every user number
+    users = users[:0:-1] + [{'user_id': 'js41637', 'items': [{'item_id': '100'}, {'item_id': '101'}]}]
+    with open(users_config['input'], 'w') as f:
+        f.writelines(json.dumps(user) + '\n' for user in users)
+    run_pipeline(config, 'sqlite://', stages, False)
+    user_ids_out = np.load('tests/outputs/reorder_model/user_ids.npy')
+    embeddings_out = dict(zip(user_ids_out, np.load('tests/outputs/reorder_model/user_embeddings.npy')))
+
+    assert set(user_ids_out) == {user['user_id'] for user in users if user['items']}
+    assert user_ids[0] not in embeddings_out
+    # Only the new user has new interactions, so every other user keeps its embedding
+    for user_id in set(user_ids_out) - {'js41637'}:
+        assert np.array_equal(embeddings_out[user_id], embeddings[user_id])
+
+
+def test_run_pipeline_ingest(caplog):
+    with open('config/config.yaml') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    config['stage_cache']['manifest'] = 'tests/outputs/pipeline_ingest_cache.json'
+    config['ingest']['games_filepath'] = 'tests/outputs/pipeline_ingest_games.csv'
+    engine_string = 'sqlite:///tests/outputs/pipeline_ingest.db'
+    for filepath in [config['stage_cache']['manifest'], 'tests/outputs/pipeline_ingest.db']:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+    pd.DataFrame({'id': [10, 20], 'app_name': ['game1', 'game2'], 'release_date': ['2013', '2014'],
+                  'url': ['google.com', 'google.com'], 'genres': ['action', 'puzzle']}).to_csv(
+        config['ingest']['games_filepath'], index=False)
+
+    run_pipeline(config, engine_string, ['ingest'])
+    assert games_table_state(engine_string)['rows'] == 2
+
+    with caplog.at_level('INFO'):
+        run_pipeline(config, engine_string, ['ingest'])
+    assert 'Skipping stage ingest' in caplog.text
+
+    # Dropping the table changes the state of the database, so ingest runs again although its inputs are unchanged
+    engine = sqlalchemy.create_engine(engine_string)
+    Games.__table__.drop(engine)
+    engine.dispose()
+    assert games_table_state(engine_string) is None
+    run_pipeline(config, engine_string, ['ingest'])
+    assert games_table_state(engine_string)['rows'] == 2
+
+
+def test_pipeline_stages_without_user_lookup():
+    with open('config/config.yaml') as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+    config['model']['interactions']['user_lookup_filepath'] = None
+    stage = pipeline_stages(config, 'sqlite://')['interactions']
+
+    assert stage.inputs == [config['model']['only']['user_games_path']]
+    assert StageCache('tests/outputs/lookup_cache.json').fingerprint('interactions', stage.inputs, stage.params())
@@ -0,0 +1,38 @@
+import pytest
+
+from src.tune import canonical_space, search_space
+
+
+def test_search_space_grid():
+    trials = search_space({'n_components': [4, 8], 'loss': ['warp', 'bpr', 'logistic']}, 'grid', None, 24)
+
+    assert len(trials) == 6
+    assert {'n_components': 8, 'loss': 'bpr'} in trials
+
+
+def test_search_space_random():
+    space = {'n_components': {'min': 4, 'max': 64}, 'learning_rate': {'min': 0.001, 'max': 0.1, 'log': True},
+             'loss': ['warp', 'bpr']}
+    trials = search_space(space, 'random', 10, 24)
+
+    assert len(trials) == 10
+    assert trials == search_space(space, 'random', 10, 24)
+    for trial in trials:
+        assert isinstance(trial['n_components'], int) and 4 <= trial['n_components'] <= 64
+        assert 0.001 <= trial['learning_rate'] <= 0.1
+        assert trial['loss'] in ('warp', 'bpr')
+
+
+def test_search_space_invalid():
+    with pytest.raises(ValueError):
+        search_space({'learning_rate': {'min': 0.001, 'max': 0.1}}, 'grid', None, 24)
+    with pytest.raises(ValueError):
+        search_space({'loss': ['warp']}, 'bayesian', 10, 24)
+
+
+def test_canonical_space():
+    space = canonical_space({'no_components': [4, 8], 'epochs': [10], 'loss': ['warp']})
+
+    assert space == {'n_components': [4, 8], 'epoch': [10], 'loss': ['warp']}
+    with pytest.raises(ValueError):
+        canonical_space({'no_components': [4], 'n_components': [8]})
@@ -0,0 +1,26 @@
+import numpy as np
+from scipy import sparse
+
+from src.model import split_interactions
+
+
+def test_split_interactions():
+    rng = np.random.RandomState(0)
+    interactions = sparse.csr_matrix((rng.rand(200, 40) < rng.rand(200, 1) * 0.5).astype(np.float32))
+    train, test = split_interactions(interactions, 0.8, 24)
+
+    assert train.shape == test.shape == interactions.shape
+    assert train.multiply(test).nnz == 0
+    assert ((train + test) != interactions).nnz == 0
+
+    counts = np.diff(interactions.indptr)
+    train_counts = np.diff(train.indptr)
+    test_counts = np.diff(test.indptr)
+    # Every user with two interactions or more is in both sets, in about the requested proportion
+    assert (train_counts[counts >= 2] >= 1).all()
+    assert (test_counts[counts >= 2] >= 1).all()
+    assert (test_counts[counts < 2] == 0).all()
+    assert np.abs(test_counts - np.clip(np.rint(counts * 0.2), 1, None) * (counts >= 2)).max() <= 1
+
+    train_again, test_again = split_interactions(interactions, 0.8, 24)
+    assert (train_again != train).nnz == 0 and (test_again != test).nnz == 0
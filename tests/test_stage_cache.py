@@ -0,0 +1,48 @@
+import os
+
+from src.stage_cache import StageCache
+
+
+def test_stage_cache():
+    manifest = 'tests/outputs/stage_cache.json'
+    if os.path.exists(manifest):
+        os.remove(manifest)
+    with open('tests/outputs/stage_input.txt', 'w') as f:
+        f.write('first')
+    with open('tests/outputs/stage_output.txt', 'w') as f:
+        f.write('output')
+
+    cache = StageCache(manifest)
+    fingerprint = cache.fingerprint('train', ['tests/outputs/stage_input.txt'], {'epoch': 30})
+    assert not cache.is_fresh('train', fingerprint, ['tests/outputs/stage_output.txt'])
+    cache.record('train', fingerprint)
+
+    cache = StageCache(manifest)
+    assert cache.fingerprint('train', ['tests/outputs/stage_input.txt'], {'epoch': 30}) == fingerprint
+    assert cache.is_fresh('train', fingerprint, ['tests/outputs/stage_output.txt'])
+    assert not cache.is_fresh('train', fingerprint, ['tests/outputs/missing_output.txt'])
+    assert cache.fingerprint('train', ['tests/outputs/stage_input.txt'], {'epoch': 10}) != fingerprint
+    assert cache.fingerprint('evaluate', ['tests/outputs/stage_input.txt'], {'epoch': 30}) != fingerprint
+
+    with open('tests/outputs/stage_input.txt', 'w') as f:
+        f.write('second')
+    assert cache.fingerprint('train', ['tests/outputs/stage_input.txt'], {'epoch': 30}) != fingerprint
+
+
+def test_stage_cache_unchecked():
+    manifest = 'tests/outputs/stage_cache_unchecked.json'
+    if os.path.exists(manifest):
+        os.remove(manifest)
+    with open('tests/outputs/stage_output.txt', 'w') as f:
+        f.write('output')
+
+    cache = StageCache(manifest)
+    cache.record('download', cache.fingerprint('download', [], {'etag': 'abc'}))
+    assert cache.is_fresh('download', cache.fingerprint('download', [], {'etag': 'abc'}),
+                          ['tests/outputs/stage_output.txt'])
+
+    # A stage whose parameters could not be checked always runs and is forgotten once it has run
+    assert cache.fingerprint('download', [], None) is None
+    assert not cache.is_fresh('download', None, ['tests/outputs/stage_output.txt'])
+    cache.record('download', None)
+    assert 'download' not in StageCache(manifest).manifest['stages']
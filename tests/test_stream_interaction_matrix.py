@@ -0,0 +1,21 @@
+import pickle
+
+import pandas as pd
+
+from src.process_data import build_interaction_matrix, stream_interaction_matrix
+
+
+def test_stream_interaction_matrix():
+    df_in = pd.DataFrame([[2, 15, 1.0], [0, 20, 1.0], [0, 10, 1.0],
+                          [1, 10, 1.0], [1, 20, 1.0], [2, 10, 1.0], [3, 5, 1.0]],
+                         columns=['uid', 'id', 'owned'])
+    df_in.to_csv('tests/outputs/users_games.csv')
+
+    test_matrix, _, test_items = build_interaction_matrix(df_in, 'uid', 'id', 'owned')
+    sparse_out = stream_interaction_matrix('tests/outputs/users_games.csv', 'uid', 'id', 'owned',
+                                           'tests/outputs/item_names.txt', 2, 'tests/outputs')
+    with open('tests/outputs/item_names.txt', 'rb') as f:
+        items_out = pickle.load(f)
+
+    assert (sparse_out.todense() == test_matrix.todense()).all()
+    assert items_out == test_items.tolist()
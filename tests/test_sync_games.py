@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+
+from src.create_db import create_db, Games, GameManager
+
+
+def test_sync_games():
+    engine_string = 'sqlite:///tests/outputs/test_sync_games.db'
+    if os.path.exists('tests/outputs/test_sync_games.db'):
+        os.remove('tests/outputs/test_sync_games.db')
+    create_db(engine_string, True)
+    columns = ['id', 'app_name', 'genres', 'release_date', 'url']
+    df_old = pd.DataFrame([[10, 'game1', 'action', '2013', 'google.com'],
+                           [10, 'game1', 'action', '2013', 'google.com'],
+                           [20, 'game2', ' ', '2013', 'google.com'],
+                           [30, 'game3', 'action', ' ', 'google.com']], columns=columns)
+    df_new = pd.DataFrame([[10, 'game1', 'action', '2013', 'google.com'],
+                           [20, 'game2', 'puzzle', '2013', 'google.com'],
+                           [40, 'game4', 'action', '2014', 'google.com']], columns=columns)
+
+    gm = GameManager(engine_string=engine_string)
+    gm.add_games(df_old, 'id', 'app_name', 'genres', 'release_date', 'url', 10)
+    unchanged_id = gm.session.query(Games).filter(Games.game_id == 10).first().id
+    counts = gm.sync_games(df_new, 'id', 'app_name', 'genres', 'release_date', 'url', 1)
+    games = gm.session.query(Games).order_by(Games.game_id).all()
+    gm.close()
+
+    assert counts == {'inserted': 1, 'updated': 1, 'deleted': 2}
+    assert [(game.game_id, game.genre) for game in games] == [(10, 'action'), (20, 'puzzle'), (40, 'action')]
+    assert games[0].id == unchanged_id
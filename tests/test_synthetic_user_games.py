@@ -0,0 +1,24 @@
+from benchmarks.synthetic import synthetic_games, synthetic_user_games
+
+
+def test_synthetic_user_games():
+    games = synthetic_games(200, seed=1)
+    df_out = synthetic_user_games(5000, 150, games['id'].to_numpy(), seed=1)
+
+    assert len(df_out) == 5000
+    assert not df_out.duplicated(['uid', 'id']).any()
+    assert df_out['id'].isin(games['id']).all()
+    assert df_out.equals(synthetic_user_games(5000, 150, games['id'].to_numpy(), seed=1))
+
+    # A few popular games and active users account for a large share of the interactions
+    game_counts = df_out['id'].value_counts()
+    user_counts = df_out['uid'].value_counts()
+    assert game_counts.iloc[:20].sum() > 0.3 * len(df_out)
+    assert user_counts.max() > 3 * user_counts.median()
+
+
+def test_synthetic_user_games_capped():
+    games = synthetic_games(10)
+    df_out = synthetic_user_games(1000, 5, games['id'].to_numpy())
+
+    assert len(df_out) == 50
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from src.model import top_k_neighbors
+
+
+def test_top_k_neighbors():
+    embeddings_in = np.array([[-.7, .2, .1], [-.2, .6, .9], [.3, -.2, -.7]])
+    neighbors_out, scores_out = top_k_neighbors(embeddings_in, 2, 2)
+    neighbors_test = np.array([[1, 2], [0, 2], [0, 1]])
+    scores_test = np.array([[0.4329906, -0.5530409], [0.4329906, -0.9351828], [-0.5530409, -0.9351828]])
+
+    assert (neighbors_out == neighbors_test).all()
+    assert np.allclose(scores_out, scores_test)
+
+
+def test_top_k_neighbors_type():
+    embeddings_in = 'test'
+    with pytest.raises(TypeError):
+        top_k_neighbors(embeddings_in, 2, 2)
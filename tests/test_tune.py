@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.tune import tune
+
+RUN_MODEL = {'n_components': 30, 'loss': 'warp', 'epoch': 30, 'n_jobs': 1, 'random_state': 24}
+
+
+def test_tune():
+    rng = np.random.RandomState(0)
+    sparse.save_npz('tests/outputs/tune_interactions.npz',
+                    sparse.csr_matrix((rng.rand(60, 25) < 0.3).astype(np.float32)))
+    space = {'n_components': [4, 8], 'loss': ['warp', 'bpr'], 'learning_rate': [0.05], 'epoch': [2]}
+    board = tune('tests/outputs/tune_interactions.npz', RUN_MODEL, space, 'grid', None, 0.8, 24, 1, 2, 'tests/outputs',
+                 'tests/outputs/leaderboard.csv')
+
+    leaderboard = pd.read_csv('tests/outputs/leaderboard.csv')
+    assert len(leaderboard) == 4
+    assert leaderboard['rank'].tolist() == [1, 2, 3, 4]
+    assert leaderboard['test_auc'].is_monotonic_decreasing
+    assert leaderboard['test_auc'].between(0, 1).all()
+    assert sorted(leaderboard['trial']) == [0, 1, 2, 3]
+    assert np.allclose(board['test_auc'], leaderboard['test_auc'])
+
+
+def test_tune_defaults():
+    rng = np.random.RandomState(0)
+    sparse.save_npz('tests/outputs/tune_interactions.npz',
+                    sparse.csr_matrix((rng.rand(60, 25) < 0.3).astype(np.float32)))
+
+    # The LightFM names are accepted, and the loss and epochs left out of the space are taken from run_model
+    space = {'no_components': [4], 'epochs': [3], 'loss': ['bpr']}
+    board_alias = tune('tests/outputs/tune_interactions.npz', dict(RUN_MODEL, epoch=1), space, 'grid', None, 0.8, 24,
+                       1, 1, 'tests/outputs', 'tests/outputs/leaderboard_alias.csv')
+    board_default = tune('tests/outputs/tune_interactions.npz', dict(RUN_MODEL, loss='bpr', epoch=3),
+                         {'n_components': [4]}, 'grid', None, 0.8, 24, 1, 1, 'tests/outputs',
+                         'tests/outputs/leaderboard_default.csv')
+
+    assert board_alias['n_components'].tolist() == [4]
+    assert board_alias['test_auc'].tolist() == board_default['test_auc'].tolist()
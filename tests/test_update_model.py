@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from lightfm import LightFM
+from scipy import sparse
+
+from src.model import update_model
+
+
+def test_update_model():
+    rng = np.random.RandomState(0)
+    previous = sparse.csr_matrix((rng.rand(20, 10) < 0.3).astype(np.float32))
+    model = LightFM(no_components=4, loss='warp', random_state=24)
+    model.fit(previous, epochs=2)
+    item_embeddings = model.item_embeddings.copy()
+
+    # User 100 and game 0 are dropped, users 200 and 201 and games 10 and 11 are new
+    user_ids = np.concatenate([np.arange(101, 120), [200, 201]])
+    item_ids = list(range(1, 12))
+    interactions = sparse.lil_matrix((21, 11), dtype=np.float32)
+    interactions[:19, :9] = previous[1:, 1:].toarray()
+    interactions[19, 0] = 1
+    interactions[20, 10] = 1
+    interactions[0, 9] = 1
+    model_out, new_out = update_model(model, np.arange(100, 120), np.arange(10), previous, interactions.tocsr(),
+                                      user_ids, item_ids, 0, 1)
+
+    assert new_out == 3
+    assert model_out.user_embeddings.shape == (21, 4)
+    assert model_out.item_embeddings.shape == (11, 4)
+    assert np.array_equal(model_out.item_embeddings[:9], item_embeddings[1:])
+    assert model_out.predict(20, np.arange(11)).shape == (11,)
+
+    model_out, _ = update_model(model_out, user_ids, item_ids, sparse.csr_matrix((21, 11)), interactions.tocsr(),
+                                user_ids, item_ids, 1, 1)
+    assert not np.array_equal(model_out.item_embeddings[:9], item_embeddings[1:])
+
+
+def test_update_model_type():
+    with pytest.raises(TypeError):
+        update_model(LightFM(), [], [], None, 'test', [], [], 1, 1)